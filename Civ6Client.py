@@ -1,8 +1,9 @@
 import asyncio
 import logging
 import os
+import time
 import traceback
-from typing import Dict, List
+from typing import Dict, List, Mapping, Optional, Set, Tuple
 import zipfile
 
 from CommonClient import ClientCommandProcessor, CommonContext, get_base_parser, logger, server_loop, gui_enabled
@@ -10,12 +11,18 @@ from .Data import get_progressive_districts_data
 from .DeathLink import handle_check_deathlink
 from NetUtils import ClientStatus
 import Utils
-from .CivVIInterface import CivVIInterface, ConnectionState
+from .CivVIInterface import CivVIInterface, ConnectionState, ItemDigest
 from .Enum import CivVICheckType
-from .Items import CivVIItemData, generate_item_table, get_item_by_civ_name
-from .Locations import generate_era_location_table
+from .Items import CivVIItemData, get_item_table, get_item_table_by_civ_name
+from .Locations import get_era_location_table
 from .TunerClient import TunerErrorException, TunerTimeoutException
 
+# Seconds between syncs with the game. Polling speeds up right after something happens and backs off while idle
+MIN_SYNC_INTERVAL = 0.5
+MAX_SYNC_INTERVAL = 5
+# Even if the game reports no changes, everything is synced at least this often (in seconds)
+FULL_SYNC_INTERVAL = 30
+
 
 class CivVICommandProcessor(ClientCommandProcessor):
     def __init__(self, ctx: CommonContext):
@@ -32,7 +39,7 @@ class CivVICommandProcessor(ClientCommandProcessor):
                 f"Deathlink is now {'enabled' if self.ctx.death_link_enabled else 'disabled'}")
 
     def _cmd_resync(self):
-        """Resends all items to client, and has client resend all locations to server. This can take up to a minute if the player has received a lot of items"""
+        """Resends the techs, civics and eras missing from the game, and has client resend all locations to server"""
         if isinstance(self.ctx, CivVIContext):
             logger.info("Resyncing...")
             asyncio.create_task(self.ctx.resync())
@@ -42,6 +49,7 @@ class CivVICommandProcessor(ClientCommandProcessor):
         if isinstance(self.ctx, CivVIContext):
             print("Toggling progressive eras, stand by...")
             self.ctx.is_pending_toggle_progressive_eras = True
+            self.ctx.request_sync()
 
 
 class CivVIContext(CommonContext):
@@ -55,8 +63,10 @@ class CivVIContext(CommonContext):
     location_name_to_civ_location = {}
     location_name_to_id = {}
     item_id_to_civ_item: Dict[int, CivVIItemData] = {}
-    item_table: Dict[str, CivVIItemData] = {}
+    item_table: Mapping[str, CivVIItemData] = {}
+    item_by_civ_name: Mapping[str, CivVIItemData] = {}
     processing_multiple_items = False
+    item_delivery_task: Optional[asyncio.Task] = None
     received_death_link = False
     death_link_message = ""
     death_link_enabled = False
@@ -64,18 +74,34 @@ class CivVIContext(CommonContext):
     death_link_just_changed = False
     # Used to prevent the deathlink from triggering when someone re enables it
 
+    # How many of items_received have been counted into the progressive counters below, so each sync only has to
+    # look at the newly received items
+    received_items_cursor = 0
+    progressive_district_counts: Dict[str, int]
+    progressive_era_count = 0
+
+    # Adaptive polling state, see request_sync and back_off_sync
+    sync_interval = MIN_SYNC_INTERVAL
+    sync_event: asyncio.Event
+    last_state_version: Optional[str] = None
+    last_full_sync = 0.0
+    is_pending_full_sync = True
+
     logger = logger
     progressive_items_by_type = get_progressive_districts_data()
     item_name_to_id = {
-        item.name: item.code for item in generate_item_table().values()}
+        item.name: item.code for item in get_item_table().values()}
     connection_state = ConnectionState.DISCONNECTED
 
     def __init__(self, server_address, password, apcivvi_file=None):
         super().__init__(server_address, password)
         self.game_interface = CivVIInterface(logger)
-        location_by_era = generate_era_location_table()
-        self.item_table = generate_item_table()
+        location_by_era = get_era_location_table()
+        self.item_table = get_item_table()
+        self.item_by_civ_name = get_item_table_by_civ_name()
         self.apcivvi_file = apcivvi_file
+        self.reset_received_items_progress()
+        self.sync_event = asyncio.Event()
 
         # Get tables formatted in a way that is easier to use here
         for era, locations in location_by_era.items():
@@ -86,15 +112,51 @@ class CivVIContext(CommonContext):
         for item_name, item in self.item_table.items():
             self.item_id_to_civ_item[item.code] = item
 
+    def reset_received_items_progress(self):
+        self.received_items_cursor = 0
+        self.progressive_district_counts = {}
+        self.progressive_era_count = 0
+
+    def request_sync(self, full_sync: bool = False):
+        """Wakes up the sync loop and polls quickly for a while. A full sync skips the check for game state changes"""
+        if full_sync:
+            self.is_pending_full_sync = True
+        self.sync_interval = MIN_SYNC_INTERVAL
+        self.sync_event.set()
+
+    def back_off_sync(self):
+        self.sync_interval = min(self.sync_interval * 2, MAX_SYNC_INTERVAL)
+
+    def is_delivering_items(self) -> bool:
+        return self.processing_multiple_items \
+            or (self.item_delivery_task is not None and not self.item_delivery_task.done())
+
     async def resync(self):
-        if self.processing_multiple_items:
+        if self.is_delivering_items():
             logger.info(
                 "Waiting for items to finish processing, try again later")
             return
-        await self.game_interface.resync()
-        await handle_receive_items(self, -1)
+        # Runs as the item delivery so the sync loop doesn't start delivering the same items alongside it
+        self.item_delivery_task = asyncio.create_task(self._resync_items())
+        await self.item_delivery_task
+        self.request_sync(full_sync=True)
         logger.info("Resynced")
 
+    async def _resync_items(self):
+        # Taken first since the game's Resync may start its received items over
+        digest = await self.game_interface.get_item_digest()
+        await self.game_interface.resync()
+        if digest is None:
+            # Mod files from before the digest, all that can be done is resending everything
+            await handle_receive_items(self, -1)
+            return
+        last_received_index = await self.game_interface.get_last_received_index()
+        if last_received_index < digest.last_received_index:
+            # The game starts over from that index, everything after it is delivered again
+            await handle_receive_items(self, last_received_index)
+        else:
+            await handle_resync_items(self, digest)
+
     def on_deathlink(self, data: Utils.Dict[str, Utils.Any]) -> None:
         super().on_deathlink(data)
         text = data.get("cause", "")
@@ -104,6 +166,7 @@ class CivVIContext(CommonContext):
             message = f"Received from {data['source']}"
         self.death_link_message = message
         self.received_death_link = True
+        self.request_sync()
 
     async def server_auth(self, password_requested: bool = False):
         if password_requested and not self.password:
@@ -126,10 +189,14 @@ class CivVIContext(CommonContext):
     def on_package(self, cmd: str, args: dict):
         if cmd == "Connected":
             self.slot_data = args["slot_data"]
+            self.reset_received_items_progress()
             if "death_link" in args["slot_data"]:
                 self.death_link_enabled = bool(args["slot_data"]["death_link"])
                 Utils.async_start(self.update_death_link(
                     bool(args["slot_data"]["death_link"])))
+            self.request_sync(full_sync=True)
+        elif cmd == "ReceivedItems":
+            self.request_sync()
 
 
 def update_connection_status(ctx: CivVIContext, status):
@@ -143,6 +210,8 @@ def update_connection_status(ctx: CivVIContext, status):
         ctx.logger.info("Disconnected from Civ VI, attempting to reconnect...")
 
     ctx.connection_state = status
+    # Anything could have changed while we weren't in a game (loaded a different save, etc)
+    ctx.is_pending_full_sync = True
 
 
 async def tuner_sync_task(ctx: CivVIContext):
@@ -153,15 +222,13 @@ async def tuner_sync_task(ctx: CivVIContext):
             continue
         else:
             try:
-                if ctx.processing_multiple_items == True:
-                    await asyncio.sleep(3)
+                state = await ctx.game_interface.is_in_game()
+                update_connection_status(ctx, state)
+                if state == ConnectionState.IN_GAME:
+                    await _handle_game_ready(ctx)
                 else:
-                    state = await ctx.game_interface.is_in_game()
-                    update_connection_status(ctx, state)
-                    if state == ConnectionState.IN_GAME:
-                        await _handle_game_ready(ctx)
-                    else:
-                        await asyncio.sleep(3)
+                    ctx.back_off_sync()
+                await wait_for_next_sync(ctx)
             except TunerTimeoutException:
                 logger.error(
                     "Timeout occurred while receiving data from Civ VI, this usually isn't a problem unless you see it repeatedly")
@@ -176,10 +243,28 @@ async def tuner_sync_task(ctx: CivVIContext):
                 continue
 
 
-async def handle_toggle_progressive_eras(ctx: CivVIContext):
+async def wait_for_next_sync(ctx: CivVIContext):
+    """Waits for the current sync interval, returning early if something requests a sync"""
+    try:
+        await asyncio.wait_for(ctx.sync_event.wait(), ctx.sync_interval)
+    except asyncio.TimeoutError:
+        pass
+    ctx.sync_event.clear()
+
+
+def has_pending_client_changes(ctx: CivVIContext) -> bool:
+    """Whether the client has something to do in game regardless of the game's state"""
+    return ctx.received_items_cursor < len(ctx.items_received) \
+        or ctx.received_death_link \
+        or ctx.is_pending_toggle_progressive_eras
+
+
+async def handle_toggle_progressive_eras(ctx: CivVIContext, current_max_allowed_era: Optional[int] = None):
     if ctx.is_pending_toggle_progressive_eras:
         ctx.is_pending_toggle_progressive_eras = False
-        current = await ctx.game_interface.get_max_allowed_era()
+        current = current_max_allowed_era
+        if current is None:
+            current = await ctx.game_interface.get_max_allowed_era()
         if current > -1:
             await ctx.game_interface.set_max_allowed_era(-1)
             logger.info("Disabled progressive eras")
@@ -193,66 +278,157 @@ async def handle_toggle_progressive_eras(ctx: CivVIContext):
             logger.info(f"Enabled progressive eras, set to {count}")
 
 
-async def handle_checked_location(ctx: CivVIContext):
-    checked_locations = await ctx.game_interface.get_checked_locations()
-    checked_location_ids = [location.code for location_name, location in ctx.location_name_to_civ_location.items(
-    ) if location_name in checked_locations]
+async def handle_checked_location(ctx: CivVIContext, checked_location_ids: Optional[List[int]] = None):
+    if checked_location_ids is None:
+        checked_location_ids = await ctx.game_interface.get_checked_locations()
 
-    await ctx.send_msgs([{"cmd": "LocationChecks", "locations": checked_location_ids}])
+    # The game keeps reporting every check, only send the ones the server doesn't know about yet
+    new_location_ids = (set(checked_location_ids) & ctx.missing_locations) - ctx.checked_locations
+    if new_location_ids:
+        await ctx.send_msgs([{"cmd": "LocationChecks", "locations": sorted(new_location_ids)}])
 
 
-async def handle_receive_items(ctx: CivVIContext, last_received_index_override: int = None):
+async def handle_receive_items(ctx: CivVIContext, last_received_index_override: int = None) -> int:
+    """Sends the game the items it hasn't received yet and returns how many were sent"""
     try:
-        last_received_index = last_received_index_override or await ctx.game_interface.get_last_received_index()
+        last_received_index = last_received_index_override
+        if last_received_index is None:
+            last_received_index = await ctx.game_interface.get_last_received_index()
         if len(ctx.items_received) - last_received_index > 1:
             ctx.processing_multiple_items = True
 
-        progressive_districts: List[CivVIItemData] = []
-        progressive_eras: List[CivVIItemData] = []
-        for index, network_item in enumerate(ctx.items_received):
+        # The counters are ahead of the game (resync, reloaded save, new connection), so count again from the start
+        if ctx.received_items_cursor > min(last_received_index + 1, len(ctx.items_received)):
+            ctx.reset_received_items_progress()
+
+        items_to_send: List[Tuple[CivVIItemData, str, int]] = []
+        for index in range(ctx.received_items_cursor, len(ctx.items_received)):
+            network_item = ctx.items_received[index]
 
             # Track these separately so if we replace "PROGRESSIVE_DISTRICT" with a specific tech, we can still check if need to add it to the list of districts
             item: CivVIItemData = ctx.item_id_to_civ_item[network_item.item]
             item_to_send: CivVIItemData = ctx.item_id_to_civ_item[network_item.item]
             if index > last_received_index:
+                sender = ctx.player_names[network_item.player]
                 if item.item_type == CivVICheckType.PROGRESSIVE_DISTRICT:
                     # if the item is progressive, then check how far in that progression type we are and send the appropriate item
-                    count = sum(
-                        1 for count_item in progressive_districts if count_item.civ_name == item.civ_name)
+                    count = ctx.progressive_district_counts.get(item.civ_name, 0)
 
                     if count >= len(ctx.progressive_items_by_type[item.civ_name]):
                         logger.error(
                             f"Received more progressive items than expected for {item.civ_name}")
-                        continue
-
-                    item_civ_name = ctx.progressive_items_by_type[item.civ_name][count]
-                    actual_item_name = get_item_by_civ_name(item_civ_name, ctx.item_table).name
-                    item_to_send = ctx.item_table[actual_item_name]
-
-                sender = ctx.player_names[network_item.player]
-                if item.item_type == CivVICheckType.ERA:
-                    count = len(progressive_eras) + 1
-                    await ctx.game_interface.give_item_to_player(item_to_send, sender, count)
-                elif item.item_type == CivVICheckType.GOODY:
-                    item_to_send.civ_vi_id = item_to_send.civ_name
-                    await ctx.game_interface.give_item_to_player(item_to_send, sender)
+                    else:
+                        item_civ_name = ctx.progressive_items_by_type[item.civ_name][count]
+                        item_to_send = ctx.item_by_civ_name[item_civ_name]
+                        items_to_send.append((item_to_send, sender, 1))
+                elif item.item_type == CivVICheckType.ERA:
+                    count = ctx.progressive_era_count + 1
+                    items_to_send.append((item_to_send, sender, count))
                 else:
-                    await ctx.game_interface.give_item_to_player(item_to_send, sender)
-                await asyncio.sleep(0.02)
+                    items_to_send.append((item_to_send, sender, 1))
 
             if item.item_type == CivVICheckType.PROGRESSIVE_DISTRICT:
-                progressive_districts.append(item)
+                ctx.progressive_district_counts[item.civ_name] = ctx.progressive_district_counts.get(item.civ_name, 0) + 1
             elif item.item_type == CivVICheckType.ERA:
-                progressive_eras.append(item)
+                ctx.progressive_era_count += 1
+            ctx.received_items_cursor = index + 1
+
+        if items_to_send:
+            start_time = time.perf_counter()
+            await ctx.game_interface.give_items_to_player(items_to_send)
+            elapsed = time.perf_counter() - start_time
+            logger.debug(
+                f"Delivered {len(items_to_send)} items in {elapsed:.2f}s ({len(items_to_send) / max(elapsed, 1e-6):.1f} items/s)")
 
         ctx.processing_multiple_items = False
+        return len(items_to_send)
     finally:
         # If something errors out, then unblock item processing
         ctx.processing_multiple_items = False
 
 
-async def handle_check_goal_complete(ctx: CivVIContext):
-    result = await ctx.game_interface.check_victory()
+def has_undelivered_items(ctx: CivVIContext, last_received_index: int) -> bool:
+    """Whether there are received items the client hasn't sent yet, or the game is missing some it was sent"""
+    return ctx.received_items_cursor < len(ctx.items_received) or last_received_index + 1 < ctx.received_items_cursor
+
+
+def start_item_delivery(ctx: CivVIContext, last_received_index: int):
+    """Delivers the new items in the background so syncing carries on during a large backlog, the tuner sends the
+    checks, victory and deathlink commands ahead of the item batches"""
+    if ctx.is_delivering_items() or not has_undelivered_items(ctx, last_received_index):
+        return
+    ctx.item_delivery_task = asyncio.create_task(_deliver_received_items(ctx, last_received_index))
+
+
+async def _deliver_received_items(ctx: CivVIContext, last_received_index: int):
+    is_delivered = False
+    sent_count = 0
+    try:
+        sent_count = await handle_receive_items(ctx, last_received_index)
+        is_delivered = True
+    except TunerTimeoutException:
+        logger.error(
+            "Timeout occurred while receiving data from Civ VI, this usually isn't a problem unless you see it repeatedly")
+    except Exception as e:
+        if isinstance(e, TunerErrorException):
+            logger.debug(str(e))
+        else:
+            logger.debug(traceback.format_exc())
+    finally:
+        # Have the game confirm what it received. The cursor is already past the items, so if the delivery failed only
+        # a full sync compares it against the game again and resends what didn't make it
+        if not is_delivered:
+            ctx.request_sync(full_sync=True)
+        elif sent_count:
+            ctx.request_sync()
+
+
+async def handle_resync_items(ctx: CivVIContext, digest: ItemDigest):
+    """Redelivers only the techs, civics and eras the game should have from the items it already received but doesn't.
+    They are granted without counting as received items, so the game's last received index doesn't move. Goody hut
+    rewards are skipped, once used they can't be told apart from never received so resending them would hand them out
+    again"""
+    if ctx.processing_multiple_items:
+        return
+    ctx.processing_multiple_items = True
+    try:
+        missing_tech_ids: Set[int] = set()
+        missing_civic_ids: Set[int] = set()
+        progressive_district_counts: Dict[str, int] = {}
+        era_count = 0
+        for network_item in ctx.items_received[:digest.last_received_index + 1]:
+            item: CivVIItemData = ctx.item_id_to_civ_item[network_item.item]
+            if item.item_type == CivVICheckType.PROGRESSIVE_DISTRICT:
+                count = progressive_district_counts.get(item.civ_name, 0)
+                progressive_district_counts[item.civ_name] = count + 1
+                if count >= len(ctx.progressive_items_by_type[item.civ_name]):
+                    continue
+                item = ctx.item_by_civ_name[ctx.progressive_items_by_type[item.civ_name][count]]
+            elif item.item_type == CivVICheckType.ERA:
+                era_count += 1
+                continue
+
+            if item.item_type == CivVICheckType.TECH and item.civ_vi_id not in digest.owned_tech_ids:
+                missing_tech_ids.add(item.civ_vi_id)
+            elif item.item_type == CivVICheckType.CIVIC and item.civ_vi_id not in digest.owned_civic_ids:
+                missing_civic_ids.add(item.civ_vi_id)
+
+        if missing_tech_ids or missing_civic_ids:
+            await ctx.game_interface.grant_items_to_player(sorted(missing_tech_ids), sorted(missing_civic_ids))
+        resent_count = len(missing_tech_ids) + len(missing_civic_ids)
+        # -1 means progressive eras are turned off
+        if -1 < digest.max_allowed_era < era_count:
+            await ctx.game_interface.set_max_allowed_era(era_count)
+            resent_count += 1
+        logger.info(f"Resent {resent_count} missing items")
+    finally:
+        ctx.processing_multiple_items = False
+
+
+async def handle_check_goal_complete(ctx: CivVIContext, is_victory: Optional[bool] = None):
+    result = is_victory
+    if result is None:
+        result = await ctx.game_interface.check_victory()
     if result:
         logger.info("Sending Victory to server!")
         await ctx.send_msgs([{"cmd": "StatusUpdate", "status": ClientStatus.CLIENT_GOAL}])
@@ -261,22 +437,52 @@ async def handle_check_goal_complete(ctx: CivVIContext):
 async def _handle_game_ready(ctx: CivVIContext):
     if ctx.server:
         if not ctx.slot:
-            await asyncio.sleep(3)
+            ctx.back_off_sync()
             return
 
-        await handle_receive_items(ctx)
-        await handle_checked_location(ctx)
-        await handle_check_goal_complete(ctx)
+        # Cheap check first, the game bumps its state version whenever something we sync could have changed
+        state_version = await ctx.game_interface.get_state_version()
+        is_full_sync = ctx.is_pending_full_sync or state_version is None \
+            or time.monotonic() - ctx.last_full_sync >= FULL_SYNC_INTERVAL
+        has_activity = state_version != ctx.last_state_version or has_pending_client_changes(ctx)
+        if not is_full_sync and not has_activity:
+            ctx.back_off_sync()
+            return
+
+        # Everything below is answered by a single round trip to the game
+        snapshot = await ctx.game_interface.get_state_snapshot()
+        if snapshot is None:
+            # Mod files from before the snapshot, the handlers ask the game for each value left as None themselves
+            last_received_index = await ctx.game_interface.get_last_received_index()
+            checked_location_ids = is_victory = deathlink = max_allowed_era = None
+        else:
+            last_received_index = snapshot.last_received_index
+            checked_location_ids = snapshot.checked_location_ids
+            is_victory = snapshot.is_victory
+            deathlink = snapshot.deathlink
+            max_allowed_era = snapshot.max_allowed_era
+
+        start_item_delivery(ctx, last_received_index)
+        await handle_checked_location(ctx, checked_location_ids)
+        await handle_check_goal_complete(ctx, is_victory)
 
         if ctx.death_link_enabled:
-            await handle_check_deathlink(ctx)
+            await handle_check_deathlink(ctx, deathlink)
 
         # process pending commands
-        await handle_toggle_progressive_eras(ctx)
-        await asyncio.sleep(3)
+        await handle_toggle_progressive_eras(ctx, max_allowed_era)
+
+        ctx.last_state_version = state_version
+        if is_full_sync:
+            ctx.is_pending_full_sync = False
+            ctx.last_full_sync = time.monotonic()
+        if has_activity:
+            ctx.sync_interval = MIN_SYNC_INTERVAL
+        else:
+            ctx.back_off_sync()
     else:
         logger.info("Waiting for player to connect to server")
-        await asyncio.sleep(3)
+        ctx.back_off_sync()
 
 
 def main(connect=None, password=None, name=None):
@@ -318,6 +524,10 @@ def main(connect=None, password=None, name=None):
             await asyncio.sleep(3)
             await ctx.tuner_sync_task
 
+        if ctx.item_delivery_task:
+            ctx.item_delivery_task.cancel()
+        ctx.game_interface.tuner.shutdown()
+
     import colorama
 
     colorama.init()
@@ -1,9 +1,36 @@
+from dataclasses import dataclass
 from enum import Enum
+from functools import lru_cache
 from logging import Logger
-from typing import List
+from types import MappingProxyType
+from typing import Iterator, List, Mapping, Optional, Set, Tuple
+
+from .Enum import CivVICheckType
+from .Items import CivVIItemData, get_item_table
+from .Locations import CIV_VI_AP_LOCATION_ID_BASE, get_flat_location_table
+from .TunerClient import MAX_COMMAND_SIZE, CommandPriority, TunerClient, TunerConnectionException, TunerErrorException, TunerTimeoutException
+
+def _format_receive_item_args_prefix(item: CivVIItemData) -> str:
+    """The arguments of HandleReceiveItem that only depend on the item, goody hut rewards are given by their civ_name"""
+    if item.item_type == CivVICheckType.GOODY:
+        item_id = f'"{item.civ_name}"'
+    else:
+        item_id = item.civ_vi_id
+    return f"{item_id}, \"{item.name}\", \"{item.item_type.value}\", "
+
+
+@lru_cache(maxsize=None)
+def get_receive_item_args_by_code() -> Mapping[int, str]:
+    """The item arguments of HandleReceiveItem for every item code, only the sender and amount change between
+    deliveries"""
+    return MappingProxyType({
+        item.code: _format_receive_item_args_prefix(item) for item in get_item_table().values()
+    })
+
+
+def escape_lua_string(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"")
 
-from .Items import CivVIItemData
-from .TunerClient import TunerClient, TunerConnectionException, TunerTimeoutException
 
 class ConnectionState(Enum):
     DISCONNECTED = 0
@@ -12,10 +39,52 @@ class ConnectionState(Enum):
 
 
 
+@dataclass
+class GameStateSnapshot:
+    """Everything the client needs from the game on each sync"""
+    last_received_index: int
+    is_victory: bool
+    max_allowed_era: int
+    checked_location_ids: List[int]
+    deathlink: str
+
+
+@dataclass
+class ItemDigest:
+    """What the game already has of the items the client delivered, used to only resend what is missing"""
+    last_received_index: int
+    max_allowed_era: int
+    owned_tech_ids: Set[int]
+    owned_civic_ids: Set[int]
+
+
+def decode_bitmap(digits: str) -> List[int]:
+    """Returns the ids set in a hex bitmap sent by the game, the lowest id being the lowest bit of the first digit"""
+    # Reversed it reads as a regular number where bit n is id n
+    bitmap = int(digits[::-1] or "0", 16)
+    return [bit for bit in range(bitmap.bit_length()) if bitmap >> bit & 1]
+
+
+def decode_checked_locations(encoded: str) -> List[int]:
+    """
+    Decodes the checked locations sent by the game into location ids. They come as # followed by comma separated
+    civ_ids, % followed by a hex bitmap of the civ_ids, or comma separated location names from GetUnsentCheckedLocations
+    in older mod files
+    """
+    if encoded.startswith("#"):
+        return [int(civ_id) + CIV_VI_AP_LOCATION_ID_BASE for civ_id in encoded[1:].split(",") if civ_id]
+    if encoded.startswith("%"):
+        return [civ_id + CIV_VI_AP_LOCATION_ID_BASE for civ_id in decode_bitmap(encoded[1:])]
+    location_table = get_flat_location_table()
+    return [location_table[name].code for name in encoded.split(",") if name in location_table]
+
+
 class CivVIInterface:
     logger: Logger
     tuner: TunerClient
     last_error: str = None
+    # Unknown until the first HandleReceiveItems command, older mod files only have HandleReceiveItem
+    supports_batched_items: Optional[bool] = None
 
     def __init__(self, logger: Logger):
         self.logger = logger
@@ -24,7 +93,7 @@ class CivVIInterface:
     async def is_in_game(self) -> ConnectionState:
         command = "IsInGame()"
         try:
-            result = await self.tuner.send_game_command(command)
+            result = await self.tuner.send_game_command(command, CommandPriority.IDLE, is_client_function=True)
             if result == "false":
                 return ConnectionState.IN_MENU
             self.last_error = None
@@ -51,68 +120,174 @@ class CivVIInterface:
             self.last_error = error
             self.logger.info(error)
 
+    def _format_receive_item_args(self, item: CivVIItemData, sender: str = "", amount: int = 1) -> str:
+        prefix = get_receive_item_args_by_code().get(item.code)
+        if prefix is None:
+            prefix = _format_receive_item_args_prefix(item)
+        return f"{prefix}\"{escape_lua_string(sender)}\", {amount}"
+
     async def give_item_to_player(self, item: CivVIItemData, sender: str = "", amount: int = 1) -> None:
-        if isinstance(item.civ_vi_id, str):
-            item_id = f'"{item.civ_vi_id}"'
-        else:
-          item_id = item.civ_vi_id
+        command = f"HandleReceiveItem({self._format_receive_item_args(item, sender, amount)})"
+        await self.tuner.send_game_command(command, CommandPriority.ITEMS)
+
+    async def give_items_to_player(self, items: List[Tuple[CivVIItemData, str, int]]) -> None:
+        """Delivers (item, sender, amount) entries in as few commands as possible, or one command per item if the mod
+        files in use don't support batches"""
+        if self.supports_batched_items is False:
+            for item, sender, amount in items:
+                await self.give_item_to_player(item, sender, amount)
+            return
+
+        for start, batch in self._batch_receive_items(items):
+            try:
+                await self.tuner.send_game_command(self._format_receive_items_command(batch), CommandPriority.ITEMS)
+            except TunerErrorException:
+                if self.supports_batched_items is not None:
+                    raise
+                self.logger.debug("HandleReceiveItems isn't supported by the mod files, delivering items one at a time")
+                self.supports_batched_items = False
+                await self.give_items_to_player(items[start:])
+                return
+            self.supports_batched_items = True
+
+    def _batch_receive_items(self, items: List[Tuple[CivVIItemData, str, int]]) -> Iterator[Tuple[int, List[str]]]:
+        """Splits (item, sender, amount) entries into HandleReceiveItems batches that each fit in a single tuner
+        message, along with the index of the first entry of each batch"""
+        empty_command_size = self.tuner.get_command_size(self._format_receive_items_command([]))
+        batch: List[str] = []
+        batch_size = empty_command_size
+        start = 0
+        for index, (item, sender, amount) in enumerate(items):
+            entry = f"{{{self._format_receive_item_args(item, sender, amount)}}}"
+            # Entries are separated by a comma
+            entry_size = len(entry.encode('utf-8')) + 1
+            if batch and batch_size + entry_size > MAX_COMMAND_SIZE:
+                yield start, batch
+                batch = []
+                batch_size = empty_command_size
+                start = index
+            batch.append(entry)
+            batch_size += entry_size
 
-        command = f"HandleReceiveItem({item_id}, \"{item.name}\", \"{item.item_type.value}\", \"{sender}\", {amount})"
-        await self.tuner.send_game_command(command)
+        if batch:
+            yield start, batch
+
+    def _format_receive_items_command(self, entries: List[str]) -> str:
+        return f"HandleReceiveItems({{{','.join(entries)}}})"
 
     async def resync(self) -> None:
         """Has the client resend all the checked locations"""
         command = "Resync()"
-        await self.tuner.send_game_command(command)
+        await self.tuner.send_game_command(command, CommandPriority.CHECKS)
 
     async def check_victory(self) -> bool:
         command = "ClientGetVictory()"
-        result = await self.tuner.send_game_command(command)
+        result = await self.tuner.send_game_command(command, CommandPriority.URGENT, is_client_function=True)
         return result == "true"
 
-    async def get_checked_locations(self) -> List[str]:
-        command = "GetUnsentCheckedLocations()"
-        result = await self.tuner.send_game_command(command, 2048 * 4)
-        return result.split(",")
+    async def get_state_version(self) -> Optional[str]:
+        """Returns a value that changes whenever something the client syncs may have changed in game, or None if the
+        mod files in use don't support it"""
+        command = "ClientGetStateVersion()"
+        try:
+            result = await self.tuner.send_game_command(command, CommandPriority.IDLE, is_client_function=True)
+        except TunerErrorException:
+            return None
+        return result or None
+
+    async def get_state_snapshot(self) -> Optional[GameStateSnapshot]:
+        """Gets the last received index, victory, max allowed era, checked locations and deathlink in one command, or
+        None if the mod files in use don't support it"""
+        command = "ClientGetStateSnapshot()"
+        try:
+            result = await self.tuner.send_game_command(command, CommandPriority.CHECKS, is_client_function=True)
+        except TunerErrorException:
+            return None
+        # The deathlink is last since it contains the name of a unit
+        fields = result.split("|", 4)
+        if len(fields) != 5:
+            raise TunerErrorException(f"Unexpected state snapshot: {result}")
+        last_received_index, victory, max_allowed_era, checked_locations, deathlink = fields
+        return GameStateSnapshot(
+            last_received_index=int(last_received_index),
+            is_victory=victory == "true",
+            max_allowed_era=int(max_allowed_era) if max_allowed_era not in ("", "nil") else -1,
+            checked_location_ids=decode_checked_locations(checked_locations),
+            deathlink=deathlink
+        )
+
+    async def get_item_digest(self) -> Optional[ItemDigest]:
+        """Gets what the game already has of the delivered items, or None if the mod files in use don't support it"""
+        command = "ClientGetItemDigest()"
+        try:
+            result = await self.tuner.send_game_command(command, CommandPriority.ITEMS, is_client_function=True)
+        except TunerErrorException:
+            return None
+        fields = result.split("|")
+        if len(fields) != 4:
+            raise TunerErrorException(f"Unexpected item digest: {result}")
+        last_received_index, max_allowed_era, owned_techs, owned_civics = fields
+        return ItemDigest(
+            last_received_index=int(last_received_index),
+            max_allowed_era=int(max_allowed_era) if max_allowed_era not in ("", "nil") else -1,
+            owned_tech_ids=set(decode_bitmap(owned_techs)),
+            owned_civic_ids=set(decode_bitmap(owned_civics)),
+        )
+
+    async def grant_items_to_player(self, tech_ids: List[int], civic_ids: List[int]) -> None:
+        """Gives the player techs and civics by civ_vi_id without them counting as received items"""
+        command = f"ClientGrantItems({{{','.join(map(str, tech_ids))}}}, {{{','.join(map(str, civic_ids))}}})"
+        await self.tuner.send_game_command(command, CommandPriority.ITEMS)
+
+    async def get_checked_locations(self) -> List[int]:
+        """Returns the ids of the locations checked in game"""
+        command = "ClientGetCheckedLocations()"
+        try:
+            result = await self.tuner.send_game_command(command, CommandPriority.CHECKS, is_client_function=True)
+        except TunerErrorException:
+            # Mod files from before location ids only report the location names
+            command = "GetUnsentCheckedLocations()"
+            result = await self.tuner.send_game_command(command, CommandPriority.CHECKS, is_client_function=True)
+        return decode_checked_locations(result)
 
     async def get_deathlink(self) -> str:
         """returns either "false" or the name of the unit that killed the player's unit"""
         command = "ClientGetDeathLink()"
-        result = await self.tuner.send_game_command(command)
+        result = await self.tuner.send_game_command(command, CommandPriority.URGENT, is_client_function=True)
         return result
 
     async def kill_unit(self, message: str) -> None:
         command = f"KillUnit(\"{message}\")"
-        await self.tuner.send_game_command(command)
+        await self.tuner.send_game_command(command, CommandPriority.URGENT)
 
     async def get_last_received_index(self) -> int:
         command = "ClientGetLastReceivedIndex()"
-        result = await self.tuner.send_game_command(command)
+        result = await self.tuner.send_game_command(command, CommandPriority.ITEMS, is_client_function=True)
         return int(result)
 
     async def send_notification(self, item: CivVIItemData, sender="someone") -> None:
         command = f"GameCore.NotificationManager:SendNotification(GameCore.NotificationTypes.USER_DEFINED_2, \"{item.name} Received\", \"You have received {item.name} from \" .. \"{sender}\", 0, {item.civ_vi_id})"
-        await self.tuner.send_command(command)
+        await self.tuner.send_command(command, CommandPriority.ITEMS)
 
     async def decrease_gold_by_percent(self, percent: int, message: str) -> None:
         command = f"DecreaseGoldByPercent({percent}, \"{message}\")"
-        await self.tuner.send_game_command(command)
+        await self.tuner.send_game_command(command, CommandPriority.URGENT)
 
     async def decrease_faith_by_percent(self, percent: int, message: str) -> None:
         command = f"DecreaseFaithByPercent({percent}, \"{message}\")"
-        await self.tuner.send_game_command(command)
+        await self.tuner.send_game_command(command, CommandPriority.URGENT)
 
     async def decrease_era_score_by_amount(self, amount: int, message: str) -> None:
         command = f"DecreaseEraScoreByAmount({amount}, \"{message}\")"
-        await self.tuner.send_game_command(command)
+        await self.tuner.send_game_command(command, CommandPriority.URGENT)
 
     async def set_max_allowed_era(self, count: int) -> None:
         command = f"SetMaxAllowedEra(\"{count}\")"
-        await self.tuner.send_game_command(command)
+        await self.tuner.send_game_command(command, CommandPriority.CHECKS)
 
     async def get_max_allowed_era(self) -> int:
         command = "ClientGetMaxAllowedEra()"
-        result = await self.tuner.send_game_command(command)
+        result = await self.tuner.send_game_command(command, CommandPriority.CHECKS, is_client_function=True)
         if result == "":
             return -1
         return int(result)
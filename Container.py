@@ -1,11 +1,13 @@
 from dataclasses import dataclass
 import os
-from typing import TYPE_CHECKING, List
+import time
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Union
 import zipfile
 from BaseClasses import ItemClassification, Location
 from worlds.Files import APContainer
 
 from .Enum import CivVICheckType
+from .Items import get_items_by_type
 from .Locations import CivVILocation, CivVILocationData
 from .Options import CivVIOptions
 
@@ -28,11 +30,12 @@ class CivTreeItem:
 
 class CivVIContainer(APContainer):
     """
-    Responsible for generating the dynamic mod files for the Civ VI multiworld
+    Responsible for generating the dynamic mod files for the Civ VI multiworld. Each file is either a string or an
+    iterable of strings that is streamed into the zip
     """
     game: str = "Civilization VI"
 
-    def __init__(self, patch_data: dict, base_path: str, output_directory: str,
+    def __init__(self, patch_data: Dict[str, Union[str, Iterable[str]]], base_path: str, output_directory: str,
                  player=None, player_name: str = "", server: str = ""):
         self.patch_data = patch_data
         self.file_path = base_path
@@ -40,8 +43,19 @@ class CivVIContainer(APContainer):
         super().__init__(container_path, player, player_name, server)
 
     def write_contents(self, opened_zipfile: zipfile.ZipFile) -> None:
-        for filename, yml in self.patch_data.items():
-            opened_zipfile.writestr(filename, yml)
+        for filename, contents in self.patch_data.items():
+            if isinstance(contents, str):
+                opened_zipfile.writestr(filename, contents)
+                continue
+            # Anything else is written into the zip as it gets generated, so the whole file is never held in memory
+            zinfo = zipfile.ZipInfo(filename, time.localtime(time.time())[:6])
+            # Same compression and permissions as writestr
+            zinfo.compress_type = opened_zipfile.compression
+            zinfo._compresslevel = opened_zipfile.compresslevel
+            zinfo.external_attr = 0o600 << 16
+            with opened_zipfile.open(zinfo, "w") as file:
+                for chunk in contents:
+                    file.write(chunk.encode())
         super().write_contents(opened_zipfile)
 
 
@@ -51,7 +65,7 @@ def get_cost(world, location: CivVILocationData) -> int:
     """
     options: CivVIOptions = world.options
     multiplier = options.research_cost_multiplier
-    return int(world.location_table[location.name].cost * multiplier)
+    return int(location.cost * multiplier)
 
 
 def get_formatted_player_name(world, player) -> str:
@@ -71,9 +85,23 @@ def get_advisor_type(world: 'CivVIWorld', location: Location) -> str:
         return "ADVISOR_GENERIC"
 
 
-def generate_new_items(world: 'CivVIWorld') -> str:
+def _format_tree_item_row(world: 'CivVIWorld', location: CivVILocation, type_column: str) -> str:
+    location_data = world.location_table[location.name]
+    return (f'{tab}<Row {type_column}="{location.name}" '
+            f'Name="{get_formatted_player_name(world, location.item.player)} '
+            f'{location.item.name}" '
+            f'EraType="{location_data.era_type}" '
+            f'UITreeRow="{location_data.uiTreeRow}" '
+            f'Cost="{get_cost(world, location_data)}" '
+            f'Description="{location.name}" '
+            f'AdvisorType="{get_advisor_type(world, location)}"'
+            f'/>{nl}')
+
+
+def iter_new_items(world: 'CivVIWorld') -> Iterator[str]:
     """
-    Generates the XML for the new techs/civics as well as the blockers used to prevent players from researching their own items
+    Generates the XML for the new techs/civics as well as the blockers used to prevent players from researching their own items.
+    Yields it a row at a time so it can be written straight into the mod files without building the whole document
     """
     locations: List[CivVILocation] = world.multiworld.get_locations(
         world.player)
@@ -97,55 +125,59 @@ def generate_new_items(world: 'CivVIWorld') -> str:
         hidden_techs = [tech.name for tech in techs]
         hidden_civics = [civic.name for civic in civics]
 
-    return f"""<?xml version="1.0" encoding="utf-8"?>
+    yield """<?xml version="1.0" encoding="utf-8"?>
 <GameInfo>
   <Types>
     <Row Type="TECH_BLOCKER" Kind="KIND_TECH" />
     <Row Type="CIVIC_BLOCKER" Kind="KIND_CIVIC" />
-  {"".join([f'{tab}<Row Type="{tech.name}" Kind="KIND_TECH" />{nl}' for
-           tech in techs])}
-  {"".join([f'{tab}<Row Type="{civic.name}" Kind="KIND_CIVIC" />{nl}' for
-            civic in civics])}
+  """
+    for tech in techs:
+        yield f'{tab}<Row Type="{tech.name}" Kind="KIND_TECH" />{nl}'
+    yield """
+  """
+    for civic in civics:
+        yield f'{tab}<Row Type="{civic.name}" Kind="KIND_CIVIC" />{nl}'
+    yield """
   </Types>
   <Technologies>
       <Row TechnologyType="TECH_BLOCKER" Name="TECH_BLOCKER" EraType="ERA_ANCIENT" UITreeRow="0" Cost="99999" AdvisorType="ADVISOR_GENERIC" Description="Archipelago Tech created to prevent players from researching their own tech. If you can read this, then congrats you have reached the end of your tree before beating the game!"/>
-{"".join([f'{tab}<Row TechnologyType="{location.name}" '
-                f'Name="{get_formatted_player_name(world, location.item.player)} '
-                f'{location.item.name}" '
-                f'EraType="{world.location_table[location.name].era_type}" '
-                f'UITreeRow="{world.location_table[location.name].uiTreeRow}" '
-                f'Cost="{get_cost(world, world.location_table[location.name])}" '
-                f'Description="{location.name}" '
-                f'AdvisorType="{get_advisor_type(world, location)}"'
-                f'/>{nl}'
-                for location in techs])}
+"""
+    for location in techs:
+        yield _format_tree_item_row(world, location, "TechnologyType")
+    yield """
   </Technologies>
   <TechnologyPrereqs>
-  {"".join([f'{tab}<Row Technology="{location.name}" PrereqTech="TECH_BLOCKER" />{nl}' for location in boost_techs])}
+  """
+    for location in boost_techs:
+        yield f'{tab}<Row Technology="{location.name}" PrereqTech="TECH_BLOCKER" />{nl}'
+    yield """
   </TechnologyPrereqs>
   <Civics>
       <Row CivicType="CIVIC_BLOCKER" Name="CIVIC_BLOCKER" EraType="ERA_ANCIENT" UITreeRow="0" Cost="99999" AdvisorType="ADVISOR_GENERIC" Description="Archipelago Civic created to prevent players from researching their own civics. If you can read this, then congrats you have reached the end of your tree before beating the game!"/>
-{"".join([f'{tab}<Row CivicType="{location.name}" '
-                    f'Name="{get_formatted_player_name(world, location.item.player)} '
-                    f'{location.item.name}" '
-                    f'EraType="{world.location_table[location.name].era_type}" '
-                    f'UITreeRow="{world.location_table[location.name].uiTreeRow}" '
-                    f'Cost="{get_cost(world, world.location_table[location.name])}" '
-                    f'Description="{location.name}" '
-                    f'AdvisorType="{get_advisor_type(world, location)}"'
-                    f'/>{nl}'
-                    for location in civics])}
+"""
+    for location in civics:
+        yield _format_tree_item_row(world, location, "CivicType")
+    yield """
   </Civics>
   <CivicPrereqs>
-  {"".join([f'{tab}<Row Civic="{location.name}" PrereqCivic="CIVIC_BLOCKER" />{nl}' for location in boost_civics])}
+  """
+    for location in boost_civics:
+        yield f'{tab}<Row Civic="{location.name}" PrereqCivic="CIVIC_BLOCKER" />{nl}'
+    yield """
   </CivicPrereqs>
 
   <Civics_XP2>
-    {"".join([f'{tab}<Row CivicType="{location}" HiddenUntilPrereqComplete="true" RandomPrereqs="false"/>{nl}' for location in hidden_civics])}
+    """
+    for location in hidden_civics:
+        yield f'{tab}<Row CivicType="{location}" HiddenUntilPrereqComplete="true" RandomPrereqs="false"/>{nl}'
+    yield """
   </Civics_XP2>
 
   <Technologies_XP2>
-    {"".join([f'{tab}<Row TechnologyType="{location}" HiddenUntilPrereqComplete="true" RandomPrereqs="false"/>{nl}' for location in hidden_techs])}
+    """
+    for location in hidden_techs:
+        yield f'{tab}<Row TechnologyType="{location}" HiddenUntilPrereqComplete="true" RandomPrereqs="false"/>{nl}'
+    yield """
   </Technologies_XP2>
 
 </GameInfo>
@@ -174,9 +206,185 @@ def generate_setup_file(world) -> str:
       Game.SetProperty("BoostsAsChecks", true)
     end
     """
+
+    setup += """
+    -- Delivers several items in a single tuner command, each entry holds the arguments for HandleReceiveItem
+    function Game.HandleReceiveItems(items)
+      for _, item in ipairs(items) do
+        Game.HandleReceiveItem(item[1], item[2], item[3], item[4], item[5])
+      end
+    end
+
+    -- Bumped whenever something the client syncs may have changed, lets the client skip syncing while nothing happens
+    local ClientStateVersion = 0
+    local function BumpClientStateVersion()
+      ClientStateVersion = ClientStateVersion + 1
+    end
+    Events.ResearchCompleted.Add(BumpClientStateVersion)
+    Events.CivicCompleted.Add(BumpClientStateVersion)
+    Events.TechBoostTriggered.Add(BumpClientStateVersion)
+    Events.CivicBoostTriggered.Add(BumpClientStateVersion)
+    Events.GoodyHutReward.Add(BumpClientStateVersion)
+    Events.GameEraChanged.Add(BumpClientStateVersion)
+    Events.UnitKilledInCombat.Add(BumpClientStateVersion)
+    Events.TurnBegin.Add(BumpClientStateVersion)
+
+    function Game.ClientGetStateVersion()
+      return "APSTART:" .. ClientStateVersion .. ":APEND"
+    end
+
+    -- Strips the client markers from the result of one of the mod's client functions
+    local function UnwrapClientResponse(response)
+      return string.match(tostring(response), "APSTART:(.*):APEND") or tostring(response)
+    end
+    """
+
+    setup += generate_location_ids_lua(world)
+
+    setup += """
+    -- Encodes the ids from 0 to maxId as hex digits, the lowest id being the lowest bit of the first digit
+    local function EncodeBitmap(isSet, maxId)
+      local digits = {}
+      for nibble = 0, math.floor(maxId / 4) do
+        local value = 0
+        for bit = 0, 3 do
+          if isSet[nibble * 4 + bit] then
+            value = value + 2 ^ bit
+          end
+        end
+        digits[nibble + 1] = string.format("%x", value)
+      end
+      return table.concat(digits)
+    end
+
+    -- Encodes a comma separated list of location names as # followed by their ids, or % followed by a bitmap of the
+    -- ids when that is shorter. A list with a name that has no id is returned as is
+    local function EncodeCheckedLocations(names)
+      local ids = {}
+      local isChecked = {}
+      local maxId = -1
+      for name in string.gmatch(names, "[^,]+") do
+        local id = LocationIds[name]
+        if id == nil then
+          return names
+        end
+        if not isChecked[id] then
+          isChecked[id] = true
+          table.insert(ids, id)
+          if id > maxId then
+            maxId = id
+          end
+        end
+      end
+
+      local list = "#" .. table.concat(ids, ",")
+      local bitmap = "%" .. EncodeBitmap(isChecked, maxId)
+      if string.len(bitmap) < string.len(list) then
+        return bitmap
+      end
+      return list
+    end
+
+    function Game.ClientGetCheckedLocations()
+      return "APSTART:" .. EncodeCheckedLocations(UnwrapClientResponse(Game.GetUnsentCheckedLocations())) .. ":APEND"
+    end
+
+    -- Everything the client syncs each tick in one response, separated by |. The deathlink goes last since it can
+    -- contain the name of a unit
+    function Game.ClientGetStateSnapshot()
+      local parts = {
+        UnwrapClientResponse(Game.ClientGetLastReceivedIndex()),
+        UnwrapClientResponse(Game.ClientGetVictory()),
+        UnwrapClientResponse(Game.ClientGetMaxAllowedEra()),
+        EncodeCheckedLocations(UnwrapClientResponse(Game.GetUnsentCheckedLocations())),
+        UnwrapClientResponse(Game.ClientGetDeathLink())
+      }
+      return "APSTART:" .. table.concat(parts, "|") .. ":APEND"
+    end
+    """
+
+    setup += generate_item_digest_lua(world)
     return setup
 
 
+def generate_location_ids_lua(world) -> str:
+    """
+    Generates the Lua table mapping each location to its civ_id, the game uses it to report checks as numbers
+    """
+    rows = "".join(f'      ["{location.name}"] = {location.civ_id},{nl}' for location in world.location_table.values())
+    return f"""
+    -- Small numeric ids for the locations, checks are reported to the client with these instead of their names
+    local LocationIds = {{
+{rows}    }}
+    """
+
+
+def generate_item_digest_lua(world) -> str:
+    """
+    Generates the Lua that tells the client which of the tech and civic items the player already has, used to only
+    redeliver what is missing when resyncing
+    """
+    techs = sorted(get_items_by_type(CivVICheckType.TECH, world.item_table), key=lambda item: item.civ_vi_id)
+    civics = sorted(get_items_by_type(CivVICheckType.CIVIC, world.item_table), key=lambda item: item.civ_vi_id)
+    return f"""
+    -- The tech and civic items by civ_vi_id
+    local DigestTechs = {{ {", ".join(f'[{item.civ_vi_id}] = "{item.civ_name}"' for item in techs)} }}
+    local DigestCivics = {{ {", ".join(f'[{item.civ_vi_id}] = "{item.civ_name}"' for item in civics)} }}
+    local DigestMaxTechId = {max((item.civ_vi_id for item in techs), default=-1)}
+    local DigestMaxCivicId = {max((item.civ_vi_id for item in civics), default=-1)}
+""" + """
+    local function GetClientPlayer()
+      for _, playerId in ipairs(PlayerManager.GetAliveMajorIDs()) do
+        if Players[playerId]:IsHuman() then
+          return Players[playerId]
+        end
+      end
+    end
+
+    -- Last received index, max allowed era and bitmaps of the owned tech and civic items, separated by |
+    function Game.ClientGetItemDigest()
+      local player = GetClientPlayer()
+      local playerTechs = player:GetTechs()
+      local playerCulture = player:GetCulture()
+      local ownedTechs = {}
+      for id, techType in pairs(DigestTechs) do
+        local tech = GameInfo.Technologies[techType]
+        ownedTechs[id] = tech ~= nil and playerTechs:HasTech(tech.Index)
+      end
+      local ownedCivics = {}
+      for id, civicType in pairs(DigestCivics) do
+        local civic = GameInfo.Civics[civicType]
+        ownedCivics[id] = civic ~= nil and playerCulture:HasCivic(civic.Index)
+      end
+      local parts = {
+        UnwrapClientResponse(Game.ClientGetLastReceivedIndex()),
+        UnwrapClientResponse(Game.ClientGetMaxAllowedEra()),
+        EncodeBitmap(ownedTechs, DigestMaxTechId),
+        EncodeBitmap(ownedCivics, DigestMaxCivicId)
+      }
+      return "APSTART:" .. table.concat(parts, "|") .. ":APEND"
+    end
+
+    -- Gives the player the tech and civic items with the given ids. Unlike HandleReceiveItem they don't count as newly
+    -- received items, so the last received index stays in step with the client when resyncing
+    function Game.ClientGrantItems(techIds, civicIds)
+      local player = GetClientPlayer()
+      for _, id in ipairs(techIds) do
+        local tech = GameInfo.Technologies[DigestTechs[id]]
+        if tech ~= nil then
+          player:GetTechs():SetTech(tech.Index, true)
+        end
+      end
+      for _, id in ipairs(civicIds) do
+        local civic = GameInfo.Civics[DigestCivics[id]]
+        if civic ~= nil then
+          player:GetCulture():SetCivic(civic.Index, true)
+        end
+      end
+    end
+    """
+
+
 def generate_goody_hut_sql(world) -> str:
     """
     Generates the SQL for the goody huts or an empty string if they are disabled since the mod expects the file to be there
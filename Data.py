@@ -1,46 +1,113 @@
 from dataclasses import dataclass
+from functools import lru_cache
+import hashlib
 import json
+import marshal
 import os
 import pkgutil
-from typing import List
+import struct
+import sys
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Tuple
 
 
+# The data bundle is generated by build/compile_data.py when building the apworld. It holds every data/*.json file
+# already decoded so they don't need to be parsed at runtime. If it is missing, outdated or corrupted the json files
+# are used instead.
+DATA_BUNDLE_PATH = os.path.join("data", "data.bundle")
+DATA_BUNDLE_MAGIC = b"CIV6DATA"
+DATA_BUNDLE_VERSION = 1
+# magic, bundle version, marshal version, sha256 of the payload
+DATA_BUNDLE_HEADER = struct.Struct("<8sHH32s")
+
 _cache = {}
 
 
+def encode_data_bundle(data: Dict[str, Any]) -> bytes:
+    payload = marshal.dumps(data)
+    digest = hashlib.sha256(payload).digest()
+    return DATA_BUNDLE_HEADER.pack(DATA_BUNDLE_MAGIC, DATA_BUNDLE_VERSION, marshal.version, digest) + payload
+
+
+def decode_data_bundle(raw: bytes) -> Optional[Dict[str, Any]]:
+    """Returns the data stored in the bundle, or None if it was built for another version or doesn't match its
+    checksum"""
+    if len(raw) < DATA_BUNDLE_HEADER.size:
+        return None
+    magic, bundle_version, marshal_version, digest = DATA_BUNDLE_HEADER.unpack_from(raw)
+    if magic != DATA_BUNDLE_MAGIC or bundle_version != DATA_BUNDLE_VERSION or marshal_version != marshal.version:
+        return None
+    payload = raw[DATA_BUNDLE_HEADER.size:]
+    if hashlib.sha256(payload).digest() != digest:
+        return None
+    try:
+        data = marshal.loads(payload)
+    except (EOFError, ValueError, TypeError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+@lru_cache(maxsize=None)
+def _get_data_bundle() -> Optional[Dict[str, Any]]:
+    try:
+        raw = pkgutil.get_data(__name__, DATA_BUNDLE_PATH)
+    except OSError:
+        return None
+    if raw is None:
+        return None
+    return decode_data_bundle(raw)
+
+
 def _get_data(key: str):
     global _cache
     if key not in _cache:
-        path = os.path.join("data", f"{key}.json")
-        _cache[key] = json.loads(
-            pkgutil.get_data(__name__, path).decode())
+        bundle = _get_data_bundle()
+        if bundle is not None and key in bundle:
+            _cache[key] = bundle[key]
+        else:
+            path = os.path.join("data", f"{key}.json")
+            _cache[key] = json.loads(
+                pkgutil.get_data(__name__, path).decode())
     return _cache[key]
 
 
-def get_boosts_data():
-    return _get_data("boosts")
-@dataclass
+@lru_cache(maxsize=None)
+def _get_data_index(key: str, field: str) -> Dict[str, List[Dict]]:
+    """Groups the rows of a data file by the value of one of their fields"""
+    index: Dict[str, List[Dict]] = {}
+    for row in _get_data(key):
+        index.setdefault(row[field], []).append(row)
+    return index
+
+
+@dataclass(frozen=True)
 class CivVIBoostData():
+    __slots__ = ("Type", "EraType", "Prereq", "PrereqRequiredCount", "Classification")
     Type: str
     EraType: str
-    Prereq: List[str]
+    Prereq: Tuple[str, ...]
     PrereqRequiredCount: int
     Classification: str
 
 
-def get_boosts_data() -> List[CivVIBoostData]:
+@lru_cache(maxsize=None)
+def get_boosts_by_type() -> Mapping[str, CivVIBoostData]:
+    """Returns a read only index of the boosts by their Type"""
     boosts_json = _get_data("boosts")
-    boosts = []
+    boosts = {}
     for boost in boosts_json:
-        boosts.append(CivVIBoostData(
-            Type=boost['Type'],
-            EraType=boost['EraType'],
-            Prereq=boost['Prereq'],
+        boosts[boost['Type']] = CivVIBoostData(
+            Type=sys.intern(boost['Type']),
+            EraType=sys.intern(boost['EraType']),
+            Prereq=tuple(sys.intern(prereq) for prereq in boost['Prereq']),
             PrereqRequiredCount=boost['PrereqRequiredCount'],
             Classification=boost['Classification']
-        ))
+        )
+    return MappingProxyType(boosts)
 
-    return boosts
+
+def get_boosts_data() -> Tuple[CivVIBoostData, ...]:
+    return tuple(get_boosts_by_type().values())
 
 
 def get_era_required_items_data():
@@ -63,6 +130,11 @@ def get_new_civic_prereqs_data():
     return _get_data("new_civic_prereqs")
 
 
+def get_new_civic_prereqs_by_civic() -> Dict[str, List[Dict]]:
+    """new_civic_prereqs grouped by Civic"""
+    return _get_data_index("new_civic_prereqs", "Civic")
+
+
 def get_new_civics_data():
     return _get_data("new_civics")
 
@@ -71,6 +143,11 @@ def get_new_tech_prereqs_data():
     return _get_data("new_tech_prereqs")
 
 
+def get_new_tech_prereqs_by_technology() -> Dict[str, List[Dict]]:
+    """new_tech_prereqs grouped by Technology"""
+    return _get_data_index("new_tech_prereqs", "Technology")
+
+
 def get_new_techs_data():
     return _get_data("new_tech")
 
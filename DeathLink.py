@@ -1,4 +1,5 @@
 import random
+from typing import Optional
 
 from CommonClient import CommonContext
 
@@ -32,15 +33,18 @@ async def handle_receive_deathlink(ctx: CommonContext, message):
         await ctx.game_interface.kill_unit(message)
 
 
-async def handle_check_deathlink(ctx: CommonContext):
-    """Checks if the local player should send out a deathlink to the multiworld as well as if we should respond to any pending deathlinks sent to us """
+async def handle_check_deathlink(ctx: CommonContext, deathlink_result: Optional[str] = None):
+    """Checks if the local player should send out a deathlink to the multiworld as well as if we should respond to any pending deathlinks sent to us.
+    deathlink_result can be passed in if the game was already asked for it"""
     # check if we received a death link
     if ctx.received_death_link:
         ctx.received_death_link = False
         await handle_receive_deathlink(ctx, ctx.death_link_message)
 
     # Check if we should send out a death link
-    result = await ctx.game_interface.get_deathlink()
+    result = deathlink_result
+    if result is None:
+        result = await ctx.game_interface.get_deathlink()
     if ctx.death_link_just_changed:
         ctx.death_link_just_changed = False
         return
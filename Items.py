@@ -1,9 +1,13 @@
 from enum import Enum
+from functools import lru_cache
 import json
+import math
 import os
 import pkgutil
 import random
-from typing import Dict, List, Optional
+import sys
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Tuple
 import typing
 from BaseClasses import Item, ItemClassification
 from .Data import get_era_required_items_data, get_existing_civics_data, get_existing_techs_data, get_goody_hut_rewards_data, get_progressive_districts_data
@@ -65,30 +69,61 @@ FILLER_DISTRIBUTION: Dict[FillerItemRarity, float] = {
 }
 
 
+def get_filler_counts(num_filler_items: int) -> Dict[FillerItemRarity, int]:
+    """
+    Splits num_filler_items between the rarities following FILLER_DISTRIBUTION. Uses the largest remainder so the
+    counts always add up exactly, then makes sure every rarity gets at least one item by taking it from the largest one
+    """
+    shares = {rarity: FILLER_DISTRIBUTION[rarity] * num_filler_items for rarity in FillerItemRarity.__reversed__()}
+    counts = {rarity: math.floor(share) for rarity, share in shares.items()}
+    remaining = num_filler_items - sum(counts.values())
+    for rarity in sorted(shares, key=lambda rarity: shares[rarity] - counts[rarity], reverse=True)[:remaining]:
+        counts[rarity] += 1
+
+    if num_filler_items >= len(counts):
+        for rarity, count in counts.items():
+            if count == 0:
+                counts[max(counts, key=counts.get)] -= 1
+                counts[rarity] = 1
+    return counts
+
+
 class FillerItemData:
+    __slots__ = ("name", "rarity", "civ_name")
     name: str
     type: str
     rarity: FillerItemRarity
     civ_name: str
 
     def __init__(self, data: Dict[str, str]):
-        self.name = data["Name"]
+        self.name = sys.intern(data["Name"])
         self.rarity = FillerItemRarity(data["Rarity"])
-        self.civ_name = data["Type"]
+        self.civ_name = sys.intern(data["Type"])
 
 
-def get_filler_item_data() -> Dict[str, FillerItemData]:
+@lru_cache(maxsize=None)
+def get_filler_item_data() -> Mapping[str, FillerItemData]:
     """
     Returns a dictionary of filler items with their data
     """
     goody_huts: List[Dict[str, str]] = get_goody_hut_rewards_data()
     # Create a FillerItemData object for each item
-    cached_filler_items = {item["Name"]: FillerItemData(item) for item in goody_huts}
+    return MappingProxyType({item["Name"]: FillerItemData(item) for item in goody_huts})
 
-    return cached_filler_items
+
+@lru_cache(maxsize=None)
+def get_filler_items_by_rarity() -> Mapping[FillerItemRarity, Tuple[FillerItemData, ...]]:
+    """
+    Returns the filler items of each rarity
+    """
+    return MappingProxyType({
+        rarity: tuple(item for item in get_filler_item_data().values() if item.rarity == rarity)
+        for rarity in FillerItemRarity
+    })
 
 
 class CivVIItemData:
+    __slots__ = ("civ_vi_id", "classification", "name", "code", "cost", "item_type", "progression_name", "civ_name")
     civ_vi_id: int
     classification: ItemClassification
     name: str
@@ -101,12 +136,12 @@ class CivVIItemData:
     def __init__(self, name, civ_vi_id: int, cost: int,  item_type: CivVICheckType, id_offset: int, classification: ItemClassification, progression_name: Optional[str], civ_name: Optional[str] = None):
         self.classification = classification
         self.civ_vi_id = civ_vi_id
-        self.name = name
+        self.name = sys.intern(name)
         self.code = civ_vi_id + CIV_VI_AP_ITEM_ID_BASE + id_offset
         self.cost = cost
         self.item_type = item_type
         self.progression_name = progression_name
-        self.civ_name = civ_name
+        self.civ_name = sys.intern(civ_name) if civ_name is not None else None
 
 
 class CivVIItem(Item):
@@ -126,7 +161,8 @@ def format_item_name(name: str) -> str:
 
 
 def get_item_by_civ_name(item_name: typing.List[str], item_table: typing.Dict[str, 'CivVIItemData']) -> 'CivVIItemData':
-    """Gets the names of the items in the item_table"""
+    """Gets the names of the items in the item_table. Scans the whole table, anything that does this repeatedly
+    should use an index from get_civ_name_to_item_table instead"""
     for item in item_table.values():
         if item_name == item.civ_name:
             return item
@@ -134,6 +170,16 @@ def get_item_by_civ_name(item_name: typing.List[str], item_table: typing.Dict[st
     raise Exception(f"Item {item_name} not found in item_table")
 
 
+def get_civ_name_to_item_table(item_table: typing.Dict[str, 'CivVIItemData']) -> typing.Dict[str, 'CivVIItemData']:
+    """Indexes the item_table by civ_name. If several items share a civ_name the first one wins, same as
+    get_item_by_civ_name"""
+    civ_name_to_item: typing.Dict[str, CivVIItemData] = {}
+    for item in item_table.values():
+        if item.civ_name not in civ_name_to_item:
+            civ_name_to_item[item.civ_name] = item
+    return civ_name_to_item
+
+
 def _generate_tech_items(id_base: int, required_items: List[str], progressive_items: Dict[str, str]) -> List[CivVIItemData]:
     # Generate Techs
     existing_techs = get_existing_techs_data()
@@ -284,6 +330,38 @@ def generate_item_table() -> Dict[str, CivVIItemData]:
     return item_table
 
 
+def generate_item_name_to_id() -> Dict[str, int]:
+    """
+    Same names and codes as generate_item_table, read straight from the data without creating any CivVIItemData
+    """
+    item_names = [
+        [tech["Name"] for tech in get_existing_techs_data()],
+        [civic["Name"] for civic in get_existing_civics_data()],
+        [format_item_name(item_name) for item_name in get_progressive_districts_data().keys()],
+        [format_item_name("PROGRESSIVE_ERA")],
+        list(dict.fromkeys(reward["Name"] for reward in get_goody_hut_rewards_data())),
+    ]
+    name_to_id: Dict[str, int] = {}
+    for names in item_names:
+        id_base = len(name_to_id)
+        for civ_vi_id, name in enumerate(names):
+            name_to_id[name] = civ_vi_id + CIV_VI_AP_ITEM_ID_BASE + id_base
+    return name_to_id
+
+
+@lru_cache(maxsize=None)
+def get_item_table() -> Mapping[str, CivVIItemData]:
+    """Returns the item table shared by every world and client in the process, options don't change any of the item
+    data"""
+    return MappingProxyType(generate_item_table())
+
+
+@lru_cache(maxsize=None)
+def get_item_table_by_civ_name() -> Mapping[str, CivVIItemData]:
+    """The shared item table from get_item_table indexed by civ_name"""
+    return MappingProxyType(get_civ_name_to_item_table(get_item_table()))
+
+
 def get_items_by_type(item_type: CivVICheckType, item_table: Dict[str, CivVIItemData]) -> List[CivVIItemData]:
     """
     Returns a list of items that match the given item type
@@ -291,9 +369,20 @@ def get_items_by_type(item_type: CivVICheckType, item_table: Dict[str, CivVIItem
     return [item for item in item_table.values() if item.item_type == item_type]
 
 
-def get_random_filler_by_rarity(rarity: FillerItemRarity, item_table: Dict[str, CivVIItemData]) -> CivVIItemData:
+def get_random_filler_by_rarity(rarity: FillerItemRarity, rng: random.Random) -> FillerItemData:
     """
     Returns a random filler item by rarity
     """
-    items = [item for item in get_filler_item_data().values() if item.rarity == rarity]
-    return items[random.randint(0, len(items) - 1)]
+    return rng.choice(get_filler_items_by_rarity()[rarity])
+
+
+def get_random_fillers(rarity_counts: Mapping[FillerItemRarity, int], rng: random.Random) -> List[FillerItemData]:
+    """
+    Returns all the requested filler items at once, picking randomly from each rarity
+    """
+    filler_items_by_rarity = get_filler_items_by_rarity()
+    fillers: List[FillerItemData] = []
+    for rarity, count in rarity_counts.items():
+        if count > 0:
+            fillers += rng.choices(filler_items_by_rarity[rarity], k=count)
+    return fillers
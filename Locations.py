@@ -1,8 +1,11 @@
 from dataclasses import dataclass
-from typing import Any, List, Optional, Dict
+from functools import lru_cache
+import sys
+from types import MappingProxyType
+from typing import Any, List, Mapping, Optional, Dict
 from BaseClasses import Location, LocationProgressType, Region
 
-from .Data import get_boosts_data, get_new_civic_prereqs_data, get_new_civics_data, get_new_tech_prereqs_data, get_new_techs_data
+from .Data import get_boosts_by_type, get_boosts_data, get_new_civic_prereqs_by_civic, get_new_civics_data, get_new_tech_prereqs_by_technology, get_new_techs_data
 
 from .Enum import CivVICheckType, EraType
 
@@ -52,8 +55,24 @@ EXCLUDED_LOCATIONS = [
     "GOODY_HUT_10",
 ]
 
+_priority_locations = frozenset(PRIORITY_LOCATIONS)
+_excluded_locations = frozenset(EXCLUDED_LOCATIONS)
+
+
+def get_location_progress_type(name: str, location_type: CivVICheckType) -> LocationProgressType:
+    if name in _priority_locations:
+        return LocationProgressType.PRIORITY
+    if name in _excluded_locations:
+        return LocationProgressType.EXCLUDED
+    if location_type == CivVICheckType.BOOST:
+        boost_data = get_boosts_by_type().get(name)
+        if boost_data and boost_data.Classification == "EXCLUDED":
+            return LocationProgressType.EXCLUDED
+    return LocationProgressType.DEFAULT
+
 
 class CivVILocationData():
+    __slots__ = ("name", "cost", "uiTreeRow", "civ_id", "code", "era_type", "location_type", "progress_type", "pre_reqs")
     game: str = "Civilization VI"
     name: str
     cost: int
@@ -62,10 +81,11 @@ class CivVILocationData():
     code: int
     era_type: EraType
     location_type: CivVICheckType
+    progress_type: LocationProgressType
     pre_reqs: List[str]
 
     def __init__(self, name: str, cost: int, uiTreeRow: int, id: int, era_type: EraType, location_type: CivVICheckType, pre_reqs: Optional[List[str]] = None):
-        self.name = name
+        self.name = sys.intern(name)
         self.cost = cost
         self.uiTreeRow = uiTreeRow
         self.civ_id = id
@@ -73,6 +93,7 @@ class CivVILocationData():
         self.era_type = era_type
         self.pre_reqs = pre_reqs
         self.location_type = location_type
+        self.progress_type = get_location_progress_type(name, location_type)
 
 
 class CivVILocation(Location):
@@ -81,31 +102,43 @@ class CivVILocation(Location):
 
     def __init__(self, player: int, name: str = '', address: Optional[int] = None, parent: Optional[Region] = None):
         super().__init__(player, name, address, parent)
-        if name.split("_")[0] == "TECH":
-            self.location_type = CivVICheckType.TECH
-        elif name.split("_")[0] == "CIVIC":
-            self.location_type = CivVICheckType.CIVIC
-        elif name.split("_")[0] == "ERA":
-            self.location_type = CivVICheckType.ERA
-        elif name.split("_")[0] == "GOODY":
-            self.location_type = CivVICheckType.GOODY
-        elif name.split("_")[0] == "BOOST":
-            self.location_type = CivVICheckType.BOOST
+        # Both are worked out once when building the location table
+        location_data = get_flat_location_table()[name]
+        self.location_type = location_data.location_type
+        self.progress_type = location_data.progress_type
+
+
 
-        if self.name in PRIORITY_LOCATIONS:
-            self.progress_type = LocationProgressType.PRIORITY
-        elif self.name in EXCLUDED_LOCATIONS:
-            self.progress_type = LocationProgressType.EXCLUDED
-        else:
-            self.progress_type = LocationProgressType.DEFAULT
 
-        if self.location_type == CivVICheckType.BOOST:
-            boost_data_list = get_boosts_data()
-            boost_data = next((boost for boost in boost_data_list if boost.Type == name), None)
-            if boost_data and boost_data.Classification == "EXCLUDED":
-                self.progress_type = LocationProgressType.EXCLUDED
+@lru_cache(maxsize=None)
+def get_era_location_table() -> Mapping[str, Mapping[str, CivVILocationData]]:
+    """Returns the location table by era shared by every world and client in the process, options only decide which
+    of these locations get created"""
+    return MappingProxyType({
+        era_type: MappingProxyType(locations) for era_type, locations in generate_era_location_table().items()
+    })
 
 
+@lru_cache(maxsize=None)
+def get_flat_location_table() -> Mapping[str, CivVILocationData]:
+    """The shared location table from get_era_location_table without the eras"""
+    flat_locations = {}
+    for locations in get_era_location_table().values():
+        flat_locations.update(locations)
+    return MappingProxyType(flat_locations)
+
+
+def generate_location_name_to_id() -> Dict[str, int]:
+    """
+    Same names and codes as generate_era_location_table, read straight from the data without creating any
+    CivVILocationData
+    """
+    location_names = [data["Type"] for data in get_new_techs_data()]
+    location_names += [data["Type"] for data in get_new_civics_data()]
+    location_names += [era.value for era in EraType if era != EraType.ERA_ANCIENT]
+    location_names += ["GOODY_HUT_" + str(i+1) for i in range(10)]
+    location_names += [boost.Type for boost in get_boosts_data()]
+    return {name: location_id + CIV_VI_AP_LOCATION_ID_BASE for location_id, name in enumerate(location_names)}
 
 
 def generate_flat_location_table() -> Dict[str, CivVILocationData]:
@@ -138,7 +171,7 @@ def generate_era_location_table() -> Dict[EraType, Dict[str, CivVILocationData]]
       ...
     }
     """
-    new_tech_prereqs = get_new_tech_prereqs_data()
+    new_tech_prereqs = get_new_tech_prereqs_by_technology()
 
     new_techs = get_new_techs_data()
     era_locations = {}
@@ -149,22 +182,20 @@ def generate_era_location_table() -> Dict[EraType, Dict[str, CivVILocationData]]
         if era_type not in era_locations:
             era_locations[era_type] = {}
 
-        prereq_data = [
-            item for item in new_tech_prereqs if item['Technology'] == data['Type']]
+        prereq_data = list(new_tech_prereqs.get(data['Type'], []))
 
         era_locations[era_type][data["Type"]] = CivVILocationData(
             data["Type"], data['Cost'], data['UITreeRow'], id_base, era_type, CivVICheckType.TECH, prereq_data)
         id_base += 1
 # Civics
-    new_civic_prereqs = get_new_civic_prereqs_data()
+    new_civic_prereqs = get_new_civic_prereqs_by_civic()
     new_civics = get_new_civics_data()
 
     for data in new_civics:
         era_type = data['EraType']
         if era_type not in era_locations:
             era_locations[era_type] = {}
-        prereq_data = [
-            item for item in new_civic_prereqs if item['Civic'] == data['Type']]
+        prereq_data = list(new_civic_prereqs.get(data['Type'], []))
         era_locations[era_type][data["Type"]] = CivVILocationData(
             data["Type"], data['Cost'], data['UITreeRow'], id_base, era_type, CivVICheckType.CIVIC, prereq_data)
         id_base += 1
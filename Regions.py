@@ -1,7 +1,7 @@
 import typing
 from BaseClasses import CollectionState, LocationProgressType, Region
 from .Data import get_era_required_items_data, get_progressive_districts_data
-from .Items import format_item_name, get_item_by_civ_name
+from .Items import format_item_name
 from .Enum import CivVICheckType, EraType
 from .Locations import CivVILocation
 from .ProgressiveDistricts import get_flat_progressive_districts
@@ -19,7 +19,7 @@ def get_required_items_for_era(era: EraType):
     return era_required_items[era.value]
 
 
-def get_cumulative_prereqs_for_era(end_era: EraType, exclude_progressive_items: bool = True, item_table: typing.Dict[str, 'CivVIItemData'] = None) -> typing.List['CivVIItemData']:
+def get_cumulative_prereqs_for_era(end_era: EraType, exclude_progressive_items: bool = True, item_by_civ_name: typing.Dict[str, 'CivVIItemData'] = None) -> typing.List['CivVIItemData']:
     """Gets the specific techs/civics that are required for the specified era as well as all previous eras"""
     cumulative_prereqs = []
     era_required_items = {}
@@ -39,65 +39,52 @@ def get_cumulative_prereqs_for_era(end_era: EraType, exclude_progressive_items:
             else:
                 prereqs_without_progressive_items.append(item)
 
-        return [get_item_by_civ_name(prereq, item_table) for prereq in prereqs_without_progressive_items]
+        return [item_by_civ_name[prereq] for prereq in prereqs_without_progressive_items]
 
-    return [get_item_by_civ_name(prereq, item_table) for prereq in cumulative_prereqs]
+    return [item_by_civ_name[prereq] for prereq in cumulative_prereqs]
 
 
-def has_required_progressive_districts(state: CollectionState, era: EraType, player: int):
-    """ If player has progressive items enabled, it will count how many progressive techs it should have, otherwise return the default array"""
-    progressive_districts = get_progressive_districts_data()
+def get_era_requirements(world: 'CivVIWorld', era: EraType, has_progressive_districts: bool, has_progressive_eras: bool) -> typing.Tuple[typing.Tuple[str, int], ...]:
+    """Precomputes the (item name, count) pairs required to move on from the specified era. If progressive districts
+    are enabled, the techs/civics that are part of a progression are counted towards their progressive item instead"""
+    item_by_civ_name = world.item_by_civ_name
+    requirements: typing.Dict[str, int] = {}
+    if has_progressive_districts:
+        # Verify we can still reach non progressive items
+        for item in get_cumulative_prereqs_for_era(era, True, item_by_civ_name):
+            requirements[item.name] = 1
+
+        # Verify we have the correct amount of progressive items
+        all_previous_items = get_cumulative_prereqs_for_era(era, False, item_by_civ_name)
+        for key, value in get_progressive_districts_data().items():
+            required_count = sum(1 for item in all_previous_items if item.civ_name in value)
+            if required_count > 0:
+                requirements[format_item_name(key)] = required_count
+    else:
+        for civ_name in get_required_items_for_era(era):
+            requirements[item_by_civ_name[civ_name].name] = 1
 
-    item_table = state.multiworld.worlds[player].item_table
-    # Verify we can still reach non progressive items
-    all_previous_items_no_progression = get_cumulative_prereqs_for_era(
-        era, True, item_table)
-    if not state.has_all([item.name for item in all_previous_items_no_progression], player):
-        return False
+    # Checks, for the given era, how many are required to proceed to the next era. Ancient = 1, Classical = 2, etc.
+    # Assumes 2 required for classical and starts from there so as to decrease odds of hard locking without the turns
+    # to get the items
+    if has_progressive_eras and era != EraType.ERA_FUTURE and era != EraType.ERA_INFORMATION:
+        era_index = list(EraType).index(era)
+        requirements[format_item_name("PROGRESSIVE_ERA")] = era_index + 2
 
-    # Verify we have the correct amount of progressive items
-    all_previous_items = get_cumulative_prereqs_for_era(
-        era, False, item_table)
-    required_counts: typing.Dict[str, int] = {}
+    return tuple(requirements.items())
 
-    for key, value in progressive_districts.items():
-        required_counts[key] = 0
-        for item in all_previous_items:
-            if item.civ_name in value:
-                required_counts[key] += 1
 
-    for key, value in required_counts.items():
-        has_amount = state.has(format_item_name(key), player, required_counts[key])
-        if not has_amount:
+def has_all_counts(state: CollectionState, requirements: typing.Tuple[typing.Tuple[str, int], ...], player: int) -> bool:
+    for item_name, count in requirements:
+        if not state.has(item_name, player, count):
             return False
     return True
 
 
-def has_required_progressive_eras(state: CollectionState, era: EraType, player: int):
-    """Checks, for the given era, how many are required to proceed to the next era. Ancient = 1, Classical = 2, etc. Assumes 2 required for classical and starts from there so as to decrease odds of hard locking without the turns to get the items"""
-    if era == EraType.ERA_FUTURE or era == EraType.ERA_INFORMATION:
-        return True
-
-    eras = [e.value for e in EraType]
-    era_index = eras.index(era.value)
-    return state.has(format_item_name("PROGRESSIVE_ERA"), player, era_index + 2)
-
-
-def has_required_items(state: CollectionState, era: EraType, player: int, has_progressive_districts: bool, has_progressive_eras: bool):
-    required_items = False
-    required_eras = False
-    if has_progressive_districts:
-        required_items = has_required_progressive_districts(state, era, player)
-    else:
-        era_required_items = [get_item_by_civ_name(item, state.multiworld.worlds[player].item_table).name for item in get_era_required_items_data()[era.value]]
-        required_items = state.has_all(era_required_items, player)
-
-    if has_progressive_eras:
-        required_eras = has_required_progressive_eras(state, era, player)
-    else:
-        required_eras = True
-
-    return required_items and required_eras
+def generate_has_required_items_lambda(requirements: typing.Tuple[typing.Tuple[str, int], ...], player: int):
+    def has_required_items_lambda(state: CollectionState):
+        return has_all_counts(state, requirements, player)
+    return has_required_items_lambda
 
 
 def create_regions(world: 'CivVIWorld', options: CivVIOptions, player: int):
@@ -109,19 +96,20 @@ def create_regions(world: 'CivVIWorld', options: CivVIOptions, player: int):
     has_goody_huts = options.shuffle_goody_hut_rewards.value
     has_boosts = options.boostsanity.value
 
+    excluded_location_types: typing.Set[CivVICheckType] = set()
+    # If progressive_eras is not enabled, then era check types from the era_locations
+    if not has_progressive_eras:
+        excluded_location_types.add(CivVICheckType.ERA)
+    if not has_goody_huts:
+        excluded_location_types.add(CivVICheckType.GOODY)
+    if not has_boosts:
+        excluded_location_types.add(CivVICheckType.BOOST)
+
     regions: typing.List[Region] = []
     for era in EraType:
         era_region = Region(era.value, player, world.multiworld)
-        era_locations = {location.name: location.code for key,
-                         location in world.location_by_era[era.value].items()}
-
-        # If progressive_eras is not enabled, then era check types from the era_locations
-        if not has_progressive_eras:
-            era_locations = {key: value for key, value in era_locations.items() if key.split("_")[0] != "ERA"}
-        if not has_goody_huts:
-            era_locations = {key: value for key, value in era_locations.items() if key.split("_")[0] != "GOODY"}
-        if not has_boosts:
-            era_locations = {key: value for key, value in era_locations.items() if key.split("_")[0] != "BOOST"}
+        era_locations = {location.name: location.code for location in world.location_by_era[era.value].values()
+                         if location.location_type not in excluded_location_types}
 
         era_region.add_locations(era_locations, CivVILocation)
 
@@ -130,44 +118,11 @@ def create_regions(world: 'CivVIWorld', options: CivVIOptions, player: int):
 
     menu.connect(world.get_region(EraType.ERA_ANCIENT.value))
 
-    world.get_region(EraType.ERA_ANCIENT.value).connect(
-        world.get_region(EraType.ERA_CLASSICAL.value), None,
-        lambda state: has_required_items(
-            state, EraType.ERA_ANCIENT, player, has_progressive_items, has_progressive_eras)
-    )
-
-    world.get_region(EraType.ERA_CLASSICAL.value).connect(
-        world.get_region(EraType.ERA_MEDIEVAL.value), None, lambda state:  has_required_items(
-            state, EraType.ERA_CLASSICAL, player, has_progressive_items, has_progressive_eras)
-    )
-
-    world.get_region(EraType.ERA_MEDIEVAL.value).connect(
-        world.get_region(EraType.ERA_RENAISSANCE.value), None, lambda state:  has_required_items(
-            state, EraType.ERA_MEDIEVAL, player, has_progressive_items, has_progressive_eras)
-    )
-
-    world.get_region(EraType.ERA_RENAISSANCE.value).connect(
-        world.get_region(EraType.ERA_INDUSTRIAL.value), None, lambda state:  has_required_items(
-            state, EraType.ERA_RENAISSANCE, player, has_progressive_items, has_progressive_eras)
-    )
-
-    world.get_region(EraType.ERA_INDUSTRIAL.value).connect(
-        world.get_region(EraType.ERA_MODERN.value), None, lambda state:  has_required_items(
-            state, EraType.ERA_INDUSTRIAL, player, has_progressive_items, has_progressive_eras)
-    )
-
-    world.get_region(EraType.ERA_MODERN.value).connect(
-        world.get_region(EraType.ERA_ATOMIC.value), None, lambda state:  has_required_items(
-            state, EraType.ERA_MODERN, player, has_progressive_items, has_progressive_eras)
-    )
-
-    world.get_region(EraType.ERA_ATOMIC.value).connect(
-        world.get_region(EraType.ERA_INFORMATION.value), None, lambda state:  has_required_items(
-            state, EraType.ERA_ATOMIC, player, has_progressive_items, has_progressive_eras)
-    )
-
-    world.get_region(EraType.ERA_INFORMATION.value).connect(
-        world.get_region(EraType.ERA_FUTURE.value), None, lambda state:  has_required_items(state, EraType.ERA_INFORMATION, player, has_progressive_items, has_progressive_eras))
+    eras = list(EraType)
+    for era, next_era in zip(eras, eras[1:]):
+        requirements = get_era_requirements(world, era, has_progressive_items, has_progressive_eras)
+        world.get_region(era.value).connect(
+            world.get_region(next_era.value), None, generate_has_required_items_lambda(requirements, player))
 
     world.multiworld.completion_condition[player] = lambda state: state.can_reach(
         EraType.ERA_FUTURE.value, "Region", player)
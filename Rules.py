@@ -1,8 +1,7 @@
 import typing
 
 from BaseClasses import CollectionState
-from .Items import get_item_by_civ_name
-from .Data import get_boosts_data
+from .Data import get_boosts_by_type
 from .Enum import CivVICheckType
 from .ProgressiveDistricts import convert_items_to_have_progression
 
@@ -13,51 +12,57 @@ if typing.TYPE_CHECKING:
     from . import CivVIWorld
 
 
-def generate_has_required_items_lambda(prereqs: typing.List[str], required_count: int, has_progressive_items: bool, player: int):
+def generate_has_required_items_lambda(requirements: typing.Tuple[typing.Tuple[str, int], ...], required_count: int, player: int):
     def has_required_items_lambda(state: CollectionState):
-        return has_required_items(state, prereqs, required_count, has_progressive_items, player)
+        return has_required_items(state, requirements, required_count, player)
     return has_required_items_lambda
 
 
 def create_boost_rules(world: 'CivVIWorld'):
-    boost_data_list = get_boosts_data()
+    boosts_by_type = get_boosts_by_type()
     boost_locations = [location for location in world.location_table.values() if location.location_type == CivVICheckType.BOOST]
+    has_progressive_items = world.options.progression_style.current_key != "none"
     for location in boost_locations:
-        boost_data = next((boost for boost in boost_data_list if boost.Type == location.name), None)
+        boost_data = boosts_by_type.get(location.name)
         world_location = world.multiworld.get_location(location.name, world.player)
         forbid_item(world_location, "Progressive Era", world.player)
         if not boost_data or boost_data.PrereqRequiredCount == 0:
             continue
 
-        has_progressive_items = world.options.progression_style.current_key != "none"
+        requirements = get_boost_requirements(world, boost_data.Prereq, has_progressive_items)
         set_rule(world_location,
-                 generate_has_required_items_lambda(boost_data.Prereq, boost_data.PrereqRequiredCount, has_progressive_items, world.player)
+                 generate_has_required_items_lambda(requirements, boost_data.PrereqRequiredCount, world.player)
                  )
 
 
-def has_required_items(state: CollectionState, prereqs: typing.List[str], required_count: int, has_progressive_items: bool, player: int):
-    if has_progressive_items:
-        items = [get_item_by_civ_name(item, state.multiworld.worlds[player].item_table).name for item in convert_items_to_have_progression(prereqs)]
-        progressive_items: typing.Dict[str, int] = {}
-        count = 0
-        for item in items:
-            if "Progressive" in item:
-                if not progressive_items.get(item):
-                    progressive_items[item] = 0
-                progressive_items[item] += 1
-            else:
-                if state.has(item, player):
-                    count += 1
-
-        for item, required_progressive_item_count in progressive_items.items():
-            if state.count(item, player) >= required_progressive_item_count:
-                count += required_progressive_item_count
-        if count > 0:
-            pass
-        return count >= required_count
-    else:
-        count = 0
-        for prereq in prereqs:
-            if state.has(get_item_by_civ_name(prereq, state.multiworld.worlds[player].item_table).name, player):
-                count += 1
-        return count >= required_count
+def get_boost_requirements(world: 'CivVIWorld', prereqs: typing.List[str], has_progressive_items: bool) -> typing.Tuple[typing.Tuple[str, int], ...]:
+    """Precomputes (item name, count) pairs for the prereqs of a boost. Having the count of an item satisfies that
+    many of the boost's required prereqs. With progressive items, prereqs that are part of the same progression are
+    grouped together and only count once the player has enough of the progressive item for all of them"""
+    item_by_civ_name = world.item_by_civ_name
+    if not has_progressive_items:
+        return tuple((item_by_civ_name[prereq].name, 1) for prereq in prereqs)
+
+    items = [item_by_civ_name[item].name for item in convert_items_to_have_progression(prereqs)]
+    requirements: typing.List[typing.Tuple[str, int]] = []
+    progressive_items: typing.Dict[str, int] = {}
+    for item in items:
+        if "Progressive" in item:
+            if not progressive_items.get(item):
+                progressive_items[item] = 0
+            progressive_items[item] += 1
+        else:
+            requirements.append((item, 1))
+
+    requirements += progressive_items.items()
+    return tuple(requirements)
+
+
+def has_required_items(state: CollectionState, requirements: typing.Tuple[typing.Tuple[str, int], ...], required_count: int, player: int):
+    count = 0
+    for item, item_count in requirements:
+        if state.has(item, player, item_count):
+            count += item_count
+            if count >= required_count:
+                return True
+    return count >= required_count
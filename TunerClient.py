@@ -1,7 +1,9 @@
 import asyncio
+from enum import IntEnum
+import itertools
 from logging import Logger
-import select
 import socket
+from typing import Optional, Tuple
 
 ADDRESS = "127.0.0.1"
 PORT = 4318
@@ -9,11 +11,98 @@ PORT = 4318
 CLIENT_PREFIX = "APSTART:"
 CLIENT_POSTFIX = ":APEND"
 
+# Every message to and from the tuner starts with an 8 byte header: the payload size followed by the message type,
+# both little endian 32 bit integers
+MESSAGE_HEADER_SIZE = 8
+MESSAGE_TYPE_COMMAND = 3
+
+# The protocol itself doesn't limit the size of a command, this only keeps batched commands to a reasonable size
+MAX_COMMAND_SIZE = 4096
+
+COMMAND_PREFIX = b"CMD:0:"
+COMMAND_DELIMITER = b"\x00"
+GAME_COMMAND_PREFIX = "GameCore.Game."
+ERROR_PREFIX = "ERR:"
+
+# How many messages without a client response (print output, leftovers of earlier commands) are skipped while waiting
+# for one before the connection is considered out of sync
+MAX_SKIPPED_MESSAGES = 16
+
 
 def decode_mixed_string(data):
     return ''.join(chr(b) if 32 <= b < 127 else '?' for b in data)
 
 
+def encode_message(payload: bytes, message_type: int = MESSAGE_TYPE_COMMAND) -> bytes:
+    """Frames a payload with the header the tuner expects"""
+    return len(payload).to_bytes(4, byteorder='little') + message_type.to_bytes(4, byteorder='little') + payload
+
+
+def encode_command(command_string: str) -> bytes:
+    """Builds the full message used to run a lua command through the tuner"""
+    return encode_message(COMMAND_PREFIX + command_string.encode('utf-8') + COMMAND_DELIMITER)
+
+
+async def read_message(reader: asyncio.StreamReader) -> bytes:
+    """Reads the next framed message from the tuner and returns its payload"""
+    header = await reader.readexactly(MESSAGE_HEADER_SIZE)
+    payload_length = int.from_bytes(header[:4], byteorder='little')
+    return await reader.readexactly(payload_length)
+
+
+async def discard_buffered_messages(reader: asyncio.StreamReader) -> int:
+    """Drops the messages that were already fully received, they are left over from earlier commands (print output,
+    the acknowledgement of a command that returns nothing) and would otherwise be read as the response to the next one.
+    Returns how many were dropped"""
+    # StreamReader has no public way to look at what it has buffered, reading what is there doesn't wait
+    buffer = reader._buffer
+    discarded = 0
+    while len(buffer) >= MESSAGE_HEADER_SIZE:
+        message_size = MESSAGE_HEADER_SIZE + int.from_bytes(buffer[:4], byteorder='little')
+        if len(buffer) < message_size:
+            break
+        await reader.readexactly(message_size)
+        discarded += 1
+    return discarded
+
+
+async def read_response(reader: asyncio.StreamReader, is_client_function: bool = False) -> bytes:
+    """Reads the response to a command. Client functions wrap their result between CLIENT_PREFIX and CLIENT_POSTFIX,
+    so for those anything else the game sends first is skipped until the result or an error arrives. Large responses
+    are split over several messages by the game, so once the start of a client response has been seen, messages are
+    joined together until the end of it arrives"""
+    b_prefix = CLIENT_PREFIX.encode('utf-8')
+    b_postfix = CLIENT_POSTFIX.encode('utf-8')
+    b_error = ERROR_PREFIX.encode('utf-8')
+    response = await read_message(reader)
+    if is_client_function:
+        skipped = 0
+        while b_prefix not in response and b_error not in response:
+            skipped += 1
+            if skipped > MAX_SKIPPED_MESSAGES:
+                raise ValueError(f"No client response after {skipped} messages")
+            response = await read_message(reader)
+
+    start = response.find(b_prefix)
+    if start == -1:
+        return response
+
+    search_from = start + len(b_prefix)
+    while response.find(b_postfix, search_from) == -1:
+        # the postfix itself could be split between two messages
+        search_from = max(search_from, len(response) - len(b_postfix) + 1)
+        response += await read_message(reader)
+    return response
+
+
+class CommandPriority(IntEnum):
+    """Commands waiting for the tuner are sent lowest value first, in the order they were queued within a priority"""
+    URGENT = 0  # victory and deathlinks
+    CHECKS = 1  # location checks and the regular sync
+    ITEMS = 2  # item delivery
+    IDLE = 3  # polling whether anything changed
+
+
 class TunerException(Exception):
     pass
 
@@ -31,11 +120,26 @@ class TunerConnectionException(TunerException):
 
 
 class TunerClient:
-    """Interfaces with Civilization via the tuner socket"""
+    """Interfaces with Civilization via the tuner socket. A single connection is kept open and reused for every
+    command, it is reopened on the next command if anything goes wrong with it. Commands are queued by priority and
+    sent one at a time, so a long item delivery doesn't hold up checks, victory or deathlinks"""
     logger: Logger
+    reader: Optional[asyncio.StreamReader] = None
+    writer: Optional[asyncio.StreamWriter] = None
+    _queue: Optional[asyncio.PriorityQueue] = None
+    _worker: Optional[asyncio.Task] = None
 
     def __init__(self, logger):
         self.logger = logger
+        # Keeps commands of the same priority in order, the futures themselves can't be compared
+        self._sequence = itertools.count()
+
+    @staticmethod
+    def get_command_size(command_string: str, is_game_command: bool = True) -> int:
+        """Returns how many bytes of the tuner's payload a command takes up once it is wrapped"""
+        if is_game_command:
+            command_string = GAME_COMMAND_PREFIX + command_string
+        return len(COMMAND_PREFIX) + len(command_string.encode('utf-8')) + len(COMMAND_DELIMITER)
 
     def __parse_response(self, response: str) -> str:
         """Parses the response from the tuner socket"""
@@ -44,62 +148,103 @@ class TunerClient:
             start = split[1]
             end = start.split(CLIENT_POSTFIX)[0]
             return end
-        elif "ERR:" in response:
+        elif ERROR_PREFIX in response:
             raise TunerErrorException(response.replace("?", ""))
         else:
             return ""
 
-    async def send_game_command(self, command_string: str, size: int = 64):
+    @property
+    def is_connected(self) -> bool:
+        return self.writer is not None and not self.writer.is_closing()
+
+    async def connect(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        """Opens the connection to the tuner if it isn't already open"""
+        if not self.is_connected:
+            self.reader, self.writer = await asyncio.open_connection(ADDRESS, PORT)
+            self.logger.debug("Opened connection to the tuner")
+        return self.reader, self.writer
+
+    def close(self) -> None:
+        """Drops the connection, the next command will reconnect"""
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = None
+        self.writer = None
+
+    def shutdown(self) -> None:
+        """Stops sending queued commands and drops the connection"""
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+        self._queue = None
+        self.close()
+
+    async def send_game_command(self, command_string: str, priority: CommandPriority = CommandPriority.IDLE,
+                                is_client_function: bool = False):
         """Small helper that prefixes a command with GameCore.Game."""
-        return await self.send_command("GameCore.Game." + command_string, size)
-
-    async def send_command(self, command_string: str, size: int = 64):
-        """Send a raw commannd"""
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.setblocking(False)
-
-        b_command_string = command_string.encode('utf-8')
-
-        # Send data to the server
-        command_prefix = b"CMD:0:"
-        delimiter = b"\x00"
-        full_command = b_command_string
-        message = command_prefix + full_command + delimiter
-        message_length = len(message).to_bytes(1, byteorder='little')
+        return await self.send_command(GAME_COMMAND_PREFIX + command_string, priority, is_client_function)
+
+    async def send_command(self, command_string: str, priority: CommandPriority = CommandPriority.IDLE,
+                           is_client_function: bool = False):
+        """Send a raw commannd, once every command with a higher priority queued before it has been sent. Client
+        functions are the mod's functions that wrap their result between CLIENT_PREFIX and CLIENT_POSTFIX"""
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.PriorityQueue()
+            self._worker = asyncio.create_task(self._send_queued_commands())
+
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((priority, next(self._sequence), command_string, is_client_function, future))
+        return await future
+
+    async def _send_queued_commands(self):
+        """Only one command can be in flight on the shared connection at a time"""
+        while True:
+            _, _, command_string, is_client_function, future = await self._queue.get()
+            if future.done():
+                # Whoever sent it stopped waiting for the response
+                continue
+            try:
+                result = await self._send_command_now(command_string, is_client_function)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
 
-        # game expects this to be added before any command that is sent, indicates payload size
-        message_header = message_length + b"\x00\x00\x00\x03\x00\x00\x00"
-        data = message_header + command_prefix + full_command + delimiter
+    async def _send_command_now(self, command_string: str, is_client_function: bool = False):
+        data = encode_command(command_string)
 
-        server_address = (ADDRESS, PORT)
-        loop = asyncio.get_event_loop()
         try:
-            await loop.sock_connect(sock, server_address)
-            await loop.sock_sendall(sock, data)
-
-            # Add a delay before receiving data
-            await asyncio.sleep(.02)
-
-            received_data = await self.async_recv(sock)
+            reader, writer = await self.connect()
+            discarded = await discard_buffered_messages(reader)
+            if discarded:
+                self.logger.debug(f"Discarded {discarded} leftover messages from the tuner")
+            writer.write(data)
+            await writer.drain()
+
+            received_data = await self.async_recv(reader, is_client_function)
             response = decode_mixed_string(received_data)
             return self.__parse_response(response)
 
-        except socket.timeout:
+        except (socket.timeout, asyncio.TimeoutError):
             self.logger.debug('Timeout occurred while receiving data')
+            # A late response would be read as the answer to the next command, so start over
+            self.close()
             raise TunerTimeoutException()
+        except TunerErrorException:
+            raise
         except Exception as e:
             self.logger.debug(f'Error occurred while receiving data: {str(e)}')
+            self.close()
             # check if No connection could be made is present in the error message
             connection_errors = [
                 "The remote computer refused the network connection",
             ]
-            if any(error in str(e) for error in connection_errors):
+            if isinstance(e, (ConnectionError, asyncio.IncompleteReadError)) or any(error in str(e) for error in connection_errors):
                 raise TunerConnectionException(e)
             else:
                 raise TunerErrorException(e)
-        finally:
-            sock.close()
 
-    async def async_recv(self, sock, timeout=2.0, size=4096):
-        response = await asyncio.wait_for(asyncio.get_event_loop().sock_recv(sock, size), timeout)
-        return response
+    async def async_recv(self, reader: asyncio.StreamReader, is_client_function: bool = False, timeout=2.0) -> bytes:
+        return await asyncio.wait_for(read_response(reader, is_client_function), timeout)
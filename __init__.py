@@ -1,19 +1,17 @@
-import math
+import logging
 import os
 import random
-from typing import Dict, Optional
+import time
+from typing import Mapping, Optional
 import typing
 
-from .Data import get_boosts_data
+from .Data import get_boosts_by_type
 
-from .Rules import create_boost_rules
 import Utils
-from .Container import CivVIContainer, generate_goody_hut_sql, generate_new_items, generate_setup_file, generate_update_boosts_sql
 from .Enum import CivVICheckType
-from .Items import BOOSTSANITY_PROGRESSION_ITEMS, FILLER_DISTRIBUTION, CivVIItemData, FillerItemRarity, generate_item_table, CivVIItem, get_random_filler_by_rarity
-from .Locations import CivVILocation, CivVILocationData, EraType, generate_era_location_table, generate_flat_location_table
+from .Items import BOOSTSANITY_PROGRESSION_ITEMS, CivVIItemData, FillerItemRarity, CivVIItem, generate_item_name_to_id, get_item_table, get_item_table_by_civ_name, get_filler_counts, get_random_filler_by_rarity, get_random_fillers
+from .Locations import CivVILocation, CivVILocationData, EraType, generate_location_name_to_id, get_era_location_table, get_flat_location_table
 from .Options import CivVIOptions
-from .Regions import create_regions
 from BaseClasses import Item, ItemClassification, MultiWorld, Tutorial
 from worlds.AutoWorld import World, WebWorld
 from worlds.LauncherComponents import Component, SuffixIdentifier, Type, components, launch_subprocess
@@ -54,36 +52,37 @@ class CivVIWorld(World):
 
     web = CivVIWeb()
 
-    item_name_to_id = {
-        item.name: item.code for item in generate_item_table().values()}
-    location_name_to_id = {
-        location.name: location.code for location in generate_flat_location_table().values()}
+    # Archipelago needs these for every apworld it loads, even when there are no Civ VI slots. The item and location
+    # tables are only built once a Civ VI world is actually created
+    item_name_to_id = generate_item_name_to_id()
+    location_name_to_id = generate_location_name_to_id()
 
-    item_table: Dict[str, CivVIItemData] = {}
-    location_by_era: Dict[EraType, Dict[str, CivVILocationData]]
+    # These are shared between every Civ VI world, none of the options change their data
+    item_table: Mapping[str, CivVIItemData] = {}
+    item_by_civ_name: Mapping[str, CivVIItemData]
+    location_by_era: Mapping[str, Mapping[str, CivVILocationData]]
+    location_table: Mapping[str, CivVILocationData]
 
     data_version = 1
     required_client_version = (0, 4, 5)
 
     def __init__(self, multiworld: "MultiWorld", player: int):
         super().__init__(multiworld, player)
-        self.location_by_era = generate_era_location_table()
-
-        self.location_table: Dict[str, CivVILocationData] = {}
-        self.item_table = generate_item_table()
-
-        for _era, locations in self.location_by_era.items():
-            for _item_name, location in locations.items():
-                self.location_table[location.name] = location
+        self.location_by_era = get_era_location_table()
+        self.location_table = get_flat_location_table()
+        self.item_table = get_item_table()
+        self.item_by_civ_name = get_item_table_by_civ_name()
 
     def get_filler_item_name(self):
-        return get_random_filler_by_rarity(FillerItemRarity.COMMON, self.item_table).name
+        return get_random_filler_by_rarity(FillerItemRarity.COMMON, self.random).name
 
     def create_regions(self):
+        from .Regions import create_regions  # lazy import
         create_regions(self, self.options, self.player)
 
     def set_rules(self) -> None:
         if self.options.boostsanity.value:
+            from .Rules import create_boost_rules  # lazy import
             create_boost_rules(self)
 
     def create_item(self, name: str) -> Item:
@@ -96,6 +95,7 @@ class CivVIWorld(World):
         return CivVIItem(item, self.player, classification)
 
     def create_items(self):
+        items: typing.List[Item] = []
         progressive_era_item = None
         for item_name, data in self.item_table.items():
             # Don't add progressive items to the itempool here
@@ -115,8 +115,7 @@ class CivVIWorld(World):
                 if item.progression_name != None:
                     item_to_create = self.item_table[item.progression_name].name
 
-            self.multiworld.itempool += [self.create_item(
-                item_to_create)]
+            items.append(self.create_item(item_to_create))
 
         # Era items
         if self.options.progression_style.current_key == "eras_and_districts":
@@ -124,8 +123,7 @@ class CivVIWorld(World):
             for era in EraType:
                 if era.value == "ERA_ANCIENT":
                     continue
-                self.multiworld.itempool += [self.create_item(
-                    progressive_era_item.name)]
+                items.append(self.create_item(progressive_era_item.name))
 
         num_filler_items = 0
         # Goody items, create 10 by default if options are enabled
@@ -133,20 +131,13 @@ class CivVIWorld(World):
             num_filler_items += 10
 
         if self.options.boostsanity.value:
-            boost_data = get_boosts_data()
-            num_filler_items += len(boost_data)
+            num_filler_items += len(get_boosts_by_type())
 
-        filler_count = {rarity: FILLER_DISTRIBUTION[rarity] * num_filler_items for rarity in FillerItemRarity.__reversed__()}
-        min_count = 1
         # Add filler items by rarity
-        total_created = 0
-        for rarity, count in filler_count.items():
-            for _ in range(max(min_count, math.ceil(count))):
-                if total_created >= num_filler_items:
-                    break
-                self.multiworld.itempool += [self.create_item(
-                    get_random_filler_by_rarity(rarity, self.item_table).name)]
-                total_created += 1
+        fillers = get_random_fillers(get_filler_counts(num_filler_items), self.random)
+        items += [self.create_item(filler.name) for filler in fillers]
+
+        self.multiworld.itempool += items
 
     def post_fill(self):
         if self.options.pre_hint_items.current_key == "none":
@@ -181,11 +172,13 @@ class CivVIWorld(World):
         }
 
     def generate_output(self, output_directory: str):
+        start = time.perf_counter()
+        from .Container import CivVIContainer, generate_goody_hut_sql, generate_setup_file, iter_new_items, generate_update_boosts_sql  # lazy import
         mod_name = self.multiworld.get_out_file_name_base(self.player)
         mod_dir = os.path.join(
             output_directory, mod_name)
         mod_files = {
-            f"NewItems.xml": generate_new_items(self),
+            f"NewItems.xml": iter_new_items(self),
             f"InitOptions.lua": generate_setup_file(self),
             f"GoodyHutOverride.sql": generate_goody_hut_sql(self),
             f"UpdateExistingBoosts.sql": generate_update_boosts_sql(self),
@@ -193,3 +186,5 @@ class CivVIWorld(World):
         mod = CivVIContainer(mod_files, mod_dir, output_directory, self.player,
                              self.multiworld.get_file_safe_player_name(self.player))
         mod.write()
+        logging.debug(f"Wrote the Civ VI mod files for {self.multiworld.get_player_name(self.player)} in "
+                      f"{time.perf_counter() - start:.2f}s")
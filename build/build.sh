@@ -17,7 +17,7 @@ set -eo pipefail
 shopt -s globstar
 
 CWD="$(dirname $(realpath $0))"
-REQS=("zip" "rsync" "pip")
+REQS=("zip" "rsync" "pip" "python3")
 SUPPORTED_PLATFORMS=("win_amd64" "manylinux2014_x86_64")
 
 ##
@@ -99,6 +99,7 @@ function mk_apworld() {
         --prune-empty-dirs \
         --exclude-from="${CWD}/apworld.ignore" \
         "${root}/" "${destdir}/civ6"
+    python3 "${CWD}/compile_data.py" "${destdir}/civ6"
     pushd "${destdir}"
     zip -9r "civ6.apworld" "civ6"
     popd
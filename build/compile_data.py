@@ -0,0 +1,36 @@
+"""
+Compiles every data/*.json file into the data bundle read by Data.py, so they don't have to be parsed at runtime.
+
+Usage: python3 compile_data.py <apworld directory>
+"""
+import glob
+import importlib.util
+import json
+import os
+import sys
+
+
+def load_data_module(root: str):
+    # Data.py has no dependency on Archipelago, it can be loaded on its own
+    spec = importlib.util.spec_from_file_location("civ6_data", os.path.join(root, "Data.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def main(root: str) -> None:
+    data_module = load_data_module(root)
+    data = {}
+    for path in sorted(glob.glob(os.path.join(root, "data", "*.json"))):
+        key = os.path.splitext(os.path.basename(path))[0]
+        with open(path, "rb") as file:
+            data[key] = json.loads(file.read().decode())
+
+    out = os.path.join(root, data_module.DATA_BUNDLE_PATH)
+    with open(out, "wb") as file:
+        file.write(data_module.encode_data_bundle(data))
+    print(f"Compiled {len(data)} data files into {out}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1])
@@ -0,0 +1,45 @@
+import unittest
+
+from ..CivVIInterface import decode_bitmap, decode_checked_locations
+from ..Locations import CIV_VI_AP_LOCATION_ID_BASE, get_flat_location_table
+
+
+class TestDecodeCheckedLocations(unittest.TestCase):
+    def test_empty(self) -> None:
+        self.assertEqual(decode_checked_locations("#"), [])
+        self.assertEqual(decode_checked_locations("%"), [])
+        self.assertEqual(decode_checked_locations(""), [])
+
+    def test_id_list(self) -> None:
+        self.assertEqual(decode_checked_locations("#0,5,17"),
+                         [CIV_VI_AP_LOCATION_ID_BASE, CIV_VI_AP_LOCATION_ID_BASE + 5, CIV_VI_AP_LOCATION_ID_BASE + 17])
+
+    def test_bitmap(self) -> None:
+        # 0x1 sets id 0, 0x8 in the second digit sets id 7, 0x2 in the fourth digit sets id 13
+        self.assertEqual(decode_checked_locations("%1802"),
+                         [CIV_VI_AP_LOCATION_ID_BASE, CIV_VI_AP_LOCATION_ID_BASE + 7, CIV_VI_AP_LOCATION_ID_BASE + 13])
+
+    def test_location_names(self) -> None:
+        locations = list(get_flat_location_table().values())[:3]
+        encoded = ",".join(location.name for location in locations)
+        self.assertEqual(decode_checked_locations(encoded), [location.code for location in locations])
+
+    def test_unknown_location_names_are_skipped(self) -> None:
+        location = next(iter(get_flat_location_table().values()))
+        self.assertEqual(decode_checked_locations(f"NOT_A_LOCATION,{location.name}"), [location.code])
+
+    def test_ids_match_location_codes(self) -> None:
+        for location in get_flat_location_table().values():
+            self.assertEqual(decode_checked_locations(f"#{location.civ_id}"), [location.code], location.name)
+
+
+class TestDecodeBitmap(unittest.TestCase):
+    def test_empty(self) -> None:
+        self.assertEqual(decode_bitmap(""), [])
+        self.assertEqual(decode_bitmap("000"), [])
+
+    def test_lowest_bit_of_first_digit_is_id_0(self) -> None:
+        self.assertEqual(decode_bitmap("1"), [0])
+        self.assertEqual(decode_bitmap("f"), [0, 1, 2, 3])
+        self.assertEqual(decode_bitmap("01"), [4])
+        self.assertEqual(decode_bitmap("a05"), [1, 3, 8, 10])
@@ -0,0 +1,26 @@
+import unittest
+
+from ..Data import DATA_BUNDLE_HEADER, _get_data, decode_data_bundle, encode_data_bundle
+
+
+class TestDataBundle(unittest.TestCase):
+    def setUp(self) -> None:
+        self.data = {
+            "boosts": _get_data("boosts"),
+            "new_tech": _get_data("new_tech"),
+        }
+
+    def test_bundle_round_trip(self) -> None:
+        self.assertEqual(decode_data_bundle(encode_data_bundle(self.data)), self.data)
+
+    def test_corrupted_bundle_is_ignored(self) -> None:
+        raw = bytearray(encode_data_bundle(self.data))
+        raw[-1] ^= 0xFF
+        self.assertIsNone(decode_data_bundle(bytes(raw)))
+        self.assertIsNone(decode_data_bundle(bytes(raw[:DATA_BUNDLE_HEADER.size - 1])))
+
+    def test_bundle_from_other_version_is_ignored(self) -> None:
+        raw = encode_data_bundle(self.data)
+        magic, version, marshal_version, digest = DATA_BUNDLE_HEADER.unpack_from(raw)
+        outdated = DATA_BUNDLE_HEADER.pack(magic, version + 1, marshal_version, digest) + raw[DATA_BUNDLE_HEADER.size:]
+        self.assertIsNone(decode_data_bundle(outdated))
@@ -1,4 +1,6 @@
-from typing import Dict
+import random
+from typing import Dict, List
+from unittest.mock import patch
 from BaseClasses import ItemClassification
 from Fill import distribute_items_restrictive
 from ..Items import FILLER_DISTRIBUTION, FillerItemRarity, get_filler_item_data
@@ -78,9 +80,9 @@ class TestFillerItemsIncludedByRarity(CivVITestBase):
                 total_filler_items += 1
 
         expected_counts = {
-            FillerItemRarity.COMMON: 101,
+            FillerItemRarity.COMMON: 102,
             FillerItemRarity.UNCOMMON: 27,
-            FillerItemRarity.RARE: 4,
+            FillerItemRarity.RARE: 3,
         }
 
         for rarity, expected in expected_counts.items():
@@ -123,3 +125,22 @@ class TestFillerItemsIncludedByRarityWithoutBoostsanity(CivVITestBase):
 
         for rarity, expected in expected_counts.items():
             self.assertEqual(rarity_counts[rarity], expected, f"Expected {expected} {rarity} items, found {rarity_counts[rarity]}")
+
+
+class TestFillerItemsAreSeeded(CivVITestBase):
+    auto_construct = False
+    options = {
+        "shuffle_goody_hut_rewards": "true",
+        "boostsanity": "true"
+    }
+
+    def get_filler_item_names(self, seed: int, global_seed: int) -> List[str]:
+        # world_setup seeds the global random from the multiworld seed, so seed it with something else to make sure
+        # the filler items only depend on the world's own random
+        seed_global_random = random.seed
+        with patch("random.seed", lambda *args, **kwargs: seed_global_random(global_seed)):
+            self.world_setup(seed)
+        return [item.name for item in self.multiworld.itempool if item.classification == ItemClassification.filler]
+
+    def test_same_seed_gives_same_filler_items(self) -> None:
+        self.assertEqual(self.get_filler_item_names(1, global_seed=1), self.get_filler_item_names(1, global_seed=2))
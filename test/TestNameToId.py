@@ -0,0 +1,15 @@
+import unittest
+
+from .. import CivVIWorld
+from ..Items import generate_item_table
+from ..Locations import generate_flat_location_table
+
+
+class TestNameToId(unittest.TestCase):
+    def test_item_name_to_id_matches_item_table(self) -> None:
+        expected = {item.name: item.code for item in generate_item_table().values()}
+        self.assertEqual(CivVIWorld.item_name_to_id, expected)
+
+    def test_location_name_to_id_matches_location_table(self) -> None:
+        expected = {location.name: location.code for location in generate_flat_location_table().values()}
+        self.assertEqual(CivVIWorld.location_name_to_id, expected)
@@ -0,0 +1,91 @@
+import asyncio
+import logging
+from typing import Dict, List
+import unittest
+
+from ..TunerClient import MAX_SKIPPED_MESSAGES, TunerClient, TunerErrorException, encode_message
+
+
+class FakeTunerWriter:
+    """Feeds the messages the game would answer each command with into the reader as the command is sent"""
+    def __init__(self, reader: asyncio.StreamReader, responses: Dict[str, List[bytes]]):
+        self.reader = reader
+        self.responses = responses
+        self.closed = False
+
+    def write(self, data: bytes) -> None:
+        for command, messages in self.responses.items():
+            if command.encode('utf-8') in data:
+                for message in messages:
+                    self.reader.feed_data(encode_message(message))
+
+    async def drain(self) -> None:
+        pass
+
+    def is_closing(self) -> bool:
+        return self.closed
+
+    def close(self) -> None:
+        self.closed = True
+
+
+class TestTunerClient(unittest.IsolatedAsyncioTestCase):
+    async def assertCommandRaises(self, exception: type, tuner: TunerClient, command: str) -> None:
+        # Not assertRaises, it clears the frames of the traceback which closes the tuner's worker
+        try:
+            await tuner.send_game_command(command, is_client_function=True)
+        except exception:
+            return
+        self.fail(f"{command} didn't raise {exception.__name__}")
+
+    def connect(self, tuner: TunerClient, responses: Dict[str, List[bytes]]) -> FakeTunerWriter:
+        tuner.reader = asyncio.StreamReader()
+        tuner.writer = FakeTunerWriter(tuner.reader, responses)
+        return tuner.writer
+
+    async def test_leftover_messages_are_not_read_as_the_next_response(self) -> None:
+        tuner = TunerClient(logging.getLogger())
+        self.connect(tuner, {
+            "HandleReceiveItems": [b"O:Received TECH_POTTERY", b"CMD:0:"],
+            "ClientGetStateSnapshot": [b"CMD:0:APSTART:3|false|2|#1,2|false:APEND"],
+        })
+        await tuner.send_game_command("HandleReceiveItems({})")
+        self.assertEqual(await tuner.send_game_command("ClientGetStateSnapshot()", is_client_function=True),
+                         "3|false|2|#1,2|false")
+        tuner.shutdown()
+
+    async def test_client_function_skips_late_messages(self) -> None:
+        tuner = TunerClient(logging.getLogger())
+        self.connect(tuner, {
+            "ClientGetLastReceivedIndex": [b"O:Received TECH_POTTERY", b"CMD:0:", b"CMD:0:APSTART:5:APEND"],
+        })
+        self.assertEqual(await tuner.send_game_command("ClientGetLastReceivedIndex()", is_client_function=True), "5")
+        tuner.shutdown()
+
+    async def test_client_function_error(self) -> None:
+        tuner = TunerClient(logging.getLogger())
+        self.connect(tuner, {
+            "ClientGetItemDigest": [b"O:Received TECH_POTTERY", b"ERR:attempt to call a nil value"],
+        })
+        await self.assertCommandRaises(TunerErrorException, tuner, "ClientGetItemDigest()")
+        self.assertTrue(tuner.is_connected)
+        tuner.shutdown()
+
+    async def test_postfix_split_between_messages(self) -> None:
+        tuner = TunerClient(logging.getLogger())
+        self.connect(tuner, {
+            "ClientGetCheckedLocations": [b"CMD:0:APSTART:#1,2", b",3:AP", b"END"],
+        })
+        self.assertEqual(await tuner.send_game_command("ClientGetCheckedLocations()", is_client_function=True),
+                         "#1,2,3")
+        tuner.shutdown()
+
+    async def test_connection_is_dropped_without_client_response(self) -> None:
+        tuner = TunerClient(logging.getLogger())
+        writer = self.connect(tuner, {
+            "ClientGetVictory": [b"CMD:0:"] * (MAX_SKIPPED_MESSAGES + 1),
+        })
+        await self.assertCommandRaises(TunerErrorException, tuner, "ClientGetVictory()")
+        self.assertTrue(writer.closed)
+        self.assertFalse(tuner.is_connected)
+        tuner.shutdown()
@@ -0,0 +1,4 @@
+"""
+Benchmarks for the Civ VI world. These aren't run as part of the tests, run them from the Archipelago root with
+`python -m worlds.civ_6.test.benchmark.<name>`
+"""
@@ -0,0 +1,26 @@
+"""Times CivVIWorld.create_items with boostsanity and goody hut rewards, the largest item pool a Civ VI slot can have"""
+import timeit
+
+from test.general import setup_solo_multiworld
+
+from ... import CivVIWorld
+
+RUNS = 100
+
+
+def run():
+    multiworld = setup_solo_multiworld(CivVIWorld, ("generate_early", "create_regions"))
+    world = multiworld.worlds[1]
+    world.options.boostsanity.value = 1
+    world.options.shuffle_goody_hut_rewards.value = 1
+
+    def create_items():
+        multiworld.itempool.clear()
+        world.create_items()
+
+    duration = timeit.timeit(create_items, number=RUNS) / RUNS
+    print(f"create_items: {len(multiworld.itempool)} items in {duration * 1000:.2f}ms")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,40 @@
+"""Measures how long importing the Civ VI world takes, which Archipelago pays for at startup even without Civ VI slots"""
+import subprocess
+import sys
+import timeit
+
+from ...Items import generate_item_name_to_id, generate_item_table
+from ...Locations import generate_flat_location_table, generate_location_name_to_id
+
+RUNS = 20
+IMPORT_SCRIPT = ("import time; start = time.perf_counter(); import worlds.civ_6; "
+                 "print(time.perf_counter() - start)")
+
+
+def build_tables_for_ids():
+    # What the world class body used to do to get its id maps
+    {item.name: item.code for item in generate_item_table().values()}
+    {location.name: location.code for location in generate_flat_location_table().values()}
+
+
+def build_name_to_id():
+    generate_item_name_to_id()
+    generate_location_name_to_id()
+
+
+def run():
+    # A fresh interpreter for each import so nothing is cached, Archipelago modules are imported beforehand
+    prelude = "import BaseClasses, Options, worlds.AutoWorld, worlds.Files; "
+    durations = [
+        float(subprocess.check_output([sys.executable, "-c", prelude + IMPORT_SCRIPT], text=True).strip())
+        for _ in range(5)
+    ]
+    print(f"Importing worlds.civ_6: best of {len(durations)} {min(durations) * 1000:.1f}ms")
+
+    tables = timeit.timeit(build_tables_for_ids, number=RUNS) / RUNS
+    name_to_id = timeit.timeit(build_name_to_id, number=RUNS) / RUNS
+    print(f"Id maps: from the full tables {tables * 1000:.2f}ms, from the data {name_to_id * 1000:.2f}ms")
+
+
+if __name__ == "__main__":
+    run()
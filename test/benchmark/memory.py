@@ -0,0 +1,41 @@
+"""Measures the memory used by the shared Civ VI tables and by each slot of a 100 player Civ VI generation"""
+import tracemalloc
+
+from test.general import gen_steps, setup_multiworld
+
+from ... import CivVIWorld
+from ...Data import get_boosts_by_type
+from ...Items import get_item_table, get_item_table_by_civ_name
+from ...Locations import get_era_location_table, get_flat_location_table
+
+SLOTS = 100
+
+
+def measure(func) -> int:
+    tracemalloc.start()
+    func()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size
+
+
+def build_shared_tables():
+    get_boosts_by_type()
+    get_item_table()
+    get_item_table_by_civ_name()
+    get_era_location_table()
+    get_flat_location_table()
+
+
+def run():
+    tables = measure(build_shared_tables)
+    print(f"Shared tables: {tables / 1024:.1f}KiB for {len(get_item_table())} items and "
+          f"{len(get_flat_location_table())} locations")
+
+    # gen_steps stops right before filling, each slot holds its own regions, locations and items by then
+    generation = measure(lambda: setup_multiworld([CivVIWorld] * SLOTS, gen_steps))
+    print(f"Generation of {SLOTS} slots: {generation / 1024 / 1024:.1f}MiB, {generation / SLOTS / 1024:.1f}KiB per slot")
+
+
+if __name__ == "__main__":
+    run()
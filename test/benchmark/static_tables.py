@@ -0,0 +1,30 @@
+"""Compares rebuilding the item and location tables for every Civ VI slot against sharing them across the process"""
+import timeit
+
+from ...Items import generate_item_table, get_item_table
+from ...Locations import generate_era_location_table, get_era_location_table, get_flat_location_table
+
+SLOTS = 50
+
+
+def rebuild_tables():
+    # What every CivVIWorld used to do in __init__
+    generate_item_table()
+    generate_era_location_table()
+
+
+def get_shared_tables():
+    get_item_table()
+    get_era_location_table()
+    get_flat_location_table()
+
+
+def run():
+    rebuilt = timeit.timeit(rebuild_tables, number=SLOTS)
+    shared = timeit.timeit(get_shared_tables, number=SLOTS)
+    print(f"Static tables for {SLOTS} slots: rebuilt {rebuilt * 1000:.1f}ms, shared {shared * 1000:.1f}ms "
+          f"({rebuilt / max(shared, 1e-9):.0f}x)")
+
+
+if __name__ == "__main__":
+    run()